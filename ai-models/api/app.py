@@ -1,16 +1,76 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+from werkzeug.serving import WSGIRequestHandler
 import sys, os, traceback
+import numpy as np
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:  # binary encoding is optional; JSON is always available
+    msgpack = None
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from modules.clustering import predict_cluster, get_personalized_insights
+from modules.clustering import predict_cluster, get_personalized_insights, FEATURES
 from modules.prediction import predict_addiction
-from modules.recommendation import recommend, get_summary_report
+from modules import prediction as prediction_module
+from modules import clustering as clustering_module
+from modules.recommendation import recommend, get_summary_report, VALIDATION_ERRORS
+from modules.validation import validate, NEGATIVE_VALUES, NOT_FINITE, ZERO_USAGE, LOW_USAGE
+from modules.neighbors import find_similar_users
+from modules.drift import get_monitor as get_drift_monitor
+from modules.history import get_store as get_history_store, to_dicts, encode_user_id
+from modules.forecasting import forecast_user
+from modules.jobs import manager as job_manager
+from modules import distillation, explanation, validation as validation_module
+from modules.result_cache import get_cache as get_result_cache, code_version
+from modules.messages import get_catalog, available_locales, DEFAULT_LOCALE, to_message_ids
 
 app = Flask(__name__)
 CORS(app)
 
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Code that shapes cached cluster/prediction results
+RESULT_CODE_VERSION = code_version(clustering_module, prediction_module, explanation, distillation,
+                                   validation_module)
+
+
+def read_payload():
+    """Request body as a dict, from MessagePack or JSON depending on Content-Type"""
+    if msgpack is not None and request.mimetype in MSGPACK_TYPES:
+        return msgpack.unpackb(request.get_data(), raw=False)
+    return request.get_json(force=True)
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def request_locale():
+    """Locale from ?locale=, else the best Accept-Language match"""
+    return request.args.get("locale") or request.accept_languages.best_match(available_locales(), DEFAULT_LOCALE)
+
+
+def respond(payload, status=200):
+    """
+    Encode a response as MessagePack if the client prefers it, else JSON.
+    Messages in the payload are rendered here, in the request's locale.
+    """
+    payload = get_catalog(request_locale()).localize(payload)
+    if msgpack is not None:
+        best = request.accept_mimetypes.best_match(["application/json", *MSGPACK_TYPES])
+        if best in MSGPACK_TYPES:
+            body = msgpack.packb(payload, use_bin_type=True, default=_to_builtin)
+            return Response(body, status=status, mimetype=best)
+    response = jsonify(payload)
+    response.status_code = status
+    return response
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok", "message": "AI Models Flask API running"})
@@ -24,48 +84,236 @@ def analyze_user():
     - Recommendations
     """
     try:
-        data = request.get_json(force=True)
+        data = read_payload()
         user_data = data.get("usage")
 
         if not user_data or len(user_data) != 4:
-            return jsonify({
+            return respond({
                 "error": True,
                 "message": "usage must be a list of 4 values: [screen_time, session_duration, app_switches, night_activity]"
-            }), 400
+            }, 400)
+
+        # Validated once here; every module below trusts the result
+        user_data = validate(user_data)
+        if user_data.has(NEGATIVE_VALUES | NOT_FINITE):
+            message, _ = VALIDATION_ERRORS[user_data.issue]
+            return respond({"error": True, "message": message}, 400)
+        if data.get("user_id"):
+            encode_user_id(data["user_id"])   # ValueError (400) before any work if it can't be stored
+
+        # Cluster/prediction results are shared across worker processes, keyed
+        # by the model, the cluster config and the code they came from
+        cache = get_result_cache()
+        result_version = (f"{prediction_module.MODEL_VERSION}+{clustering_module.CONFIG_VERSION}"
+                          f"+{RESULT_CODE_VERSION}")
+        cached = cache.get(user_data, result_version)
+        if cached:
+            cluster, prediction = cached["cluster"], cached["prediction"]
+        else:
+            cluster = predict_cluster(user_data)
+            prediction = predict_addiction(user_data, explain=True)
+            cache.put(user_data, result_version,
+                      {"cluster": cluster, "prediction": prediction})
 
-        cluster = predict_cluster(user_data)
-        prediction = predict_addiction(user_data)
-        recs = recommend(user_data)
+        # Goals follow the user's trajectory once they have enough history
+        forecast = None
+        if data.get("user_id"):
+            forecast = forecast_user(data["user_id"], get_history_store())
 
-        return jsonify({
+        recs = recommend(user_data, forecast, cluster, prediction)
+        # The zero/low-usage shortcuts answer 0.0 without the model; only count model outputs
+        model_probability = None if user_data.has(ZERO_USAGE | LOW_USAGE) else prediction["probability"]
+        get_drift_monitor().record(user_data, model_probability)
+
+        # Callers that identify the user get the result appended to their history
+        if data.get("user_id"):
+            get_history_store().append(
+                data["user_id"], user_data, cluster["cluster"], prediction["prediction"],
+                prediction["probability"], prediction_module.MODEL_VERSION
+            )
+
+        response = {
             "error": False,
             "cluster": cluster,
             "prediction": prediction,
             "recommendations": recs
-        })
+        }
+        # Clients holding the /messages catalog can ask for ids instead of text
+        if data.get("message_ids"):
+            response["recommendations"] = to_message_ids(recs)
+            response["catalog_version"] = get_catalog(request_locale()).version
 
+        return respond(response)
+
+    except ValueError as e:
+        return respond({"error": True, "message": str(e)}, 400)
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": True, "message": str(e)}), 500
+        return respond({"error": True, "message": str(e)}, 500)
+
+
+@app.route("/similar", methods=["POST"])
+def similar_users():
+    """Return the k users whose usage pattern is closest to the given one"""
+    try:
+        data = read_payload()
+        user_data = data.get("usage")
+
+        if not user_data or len(user_data) != 4:
+            return respond({
+                "error": True,
+                "message": "usage must be a list of 4 values: [screen_time, session_duration, app_switches, night_activity]"
+            }, 400)
+
+        user_data = validate(user_data)
+        if user_data.has(NEGATIVE_VALUES | NOT_FINITE):
+            message, _ = VALIDATION_ERRORS[user_data.issue]
+            return respond({"error": True, "message": message}, 400)
+        try:
+            k = min(max(int(data.get("k", 5)), 1), 50)
+        except (TypeError, ValueError):
+            return respond({"error": True, "message": "k must be an integer"}, 400)
+
+        try:
+            result = find_similar_users(user_data, k=k)
+        except FileNotFoundError:
+            return respond({"error": True, "message": "neighbor index not built"}, 503)
+
+        return respond({"error": False, **result})
+
+    except ValueError as e:
+        return respond({"error": True, "message": str(e)}, 400)
+    except Exception as e:
+        traceback.print_exc()
+        return respond({"error": True, "message": str(e)}, 500)
+
+
+@app.route("/drift", methods=["GET"])
+def drift():
+    """Compare recent /analyze inputs and predictions against the training distribution"""
+    try:
+        return respond({"error": False, **get_drift_monitor().report()})
+
+    except Exception as e:
+        traceback.print_exc()
+        return respond({"error": True, "message": str(e)}, 500)
+
+
+@app.route("/history/<user_id>", methods=["GET"])
+def history(user_id):
+    """Return a user's stored analyses: the last n, or those between start and end (epoch seconds)"""
+    try:
+        start = request.args.get("start", type=float)
+        end = request.args.get("end", type=float)
+        store = get_history_store()
+
+        if start is not None or end is not None:
+            records = store.range(user_id, start, end)
+        else:
+            records = store.last(user_id, min(max(request.args.get("n", 10, type=int), 1), 1000))
+
+        return respond({"error": False, "history": to_dicts(records)})
+
+    except ValueError as e:
+        return respond({"error": True, "message": str(e)}, 400)
+    except Exception as e:
+        traceback.print_exc()
+        return respond({"error": True, "message": str(e)}, 500)
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Start a bulk analysis job.
+    Accepts JSON {"usage": [[...], ...]} or a CSV upload ("file") with the feature columns.
+    """
+    try:
+        if "file" in request.files:
+            df = pd.read_csv(request.files["file"])
+            missing = [feature for feature in FEATURES if feature not in df]
+            if missing:
+                return respond({"error": True, "message": f"CSV is missing columns: {missing}"}, 400)
+            rows = df[FEATURES].values
+        else:
+            rows = (read_payload() or {}).get("usage")
+            try:
+                rows = np.asarray(rows, dtype=float)
+            except (TypeError, ValueError):   # ragged or non-numeric rows
+                rows = None
+            if rows is None or rows.ndim != 2 or rows.shape[1] != 4 or not len(rows):
+                return respond({
+                    "error": True,
+                    "message": "usage must be a list of rows of 4 values: [screen_time, session_duration, app_switches, night_activity]"
+                }, 400)
+
+        job = job_manager.submit(rows)
+        return respond({"error": False, **job.to_dict()}, 202)
+
+    except ValueError as e:
+        return respond({"error": True, "message": str(e)}, 400)
+    except Exception as e:
+        traceback.print_exc()
+        return respond({"error": True, "message": str(e)}, 500)
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Return progress of a bulk analysis job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return respond({"error": True, "message": "job not found"}, 404)
+    return respond({"error": False, **job.to_dict()})
+
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results(job_id):
+    """Return a page of job results in input order (?offset=0&limit=500)"""
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 500, type=int), 1), 5000)
+    page = job_manager.results(job_id, offset, limit)
+    if page is None:
+        return respond({"error": True, "message": "job not found"}, 404)
+    return respond({"error": False, **page})
+
+
+@app.route("/messages", methods=["GET"])
+def messages():
+    """Message catalog (texts and templates by id) for the request's locale, cacheable by its version (ETag)"""
+    catalog = get_catalog(request_locale())
+    headers = {"ETag": f'"{catalog.version}"', "Content-Language": catalog.locale, "Vary": "Accept-Language"}
+    if request.if_none_match.contains(catalog.version):
+        return Response(status=304, headers=headers)
+
+    if msgpack is not None and request.accept_mimetypes.best_match(["application/json", *MSGPACK_TYPES]) in MSGPACK_TYPES:
+        response = respond({"error": False, "version": catalog.version, "locale": catalog.locale,
+                            "messages": catalog.messages})
+    else:
+        # Encoded once per locale and process
+        response = Response(catalog.body(), mimetype="application/json")
+    response.headers.update(headers)
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
 
 
 @app.route("/summary", methods=["POST"])
 def summary():
     """Return formatted summary report (text-based)"""
     try:
-        data = request.get_json(force=True)
+        data = read_payload()
         user_data = data.get("usage")
         if not user_data:
-            return jsonify({"error": True, "message": "usage data required"}), 400
+            return respond({"error": True, "message": "usage data required"}, 400)
 
-        report = get_summary_report(user_data)
-        return jsonify({"report": report})
+        report = get_summary_report(user_data, request_locale())
+        return respond({"report": report})
 
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": True, "message": str(e)}), 500
+        return respond({"error": True, "message": str(e)}, 500)
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    # HTTP/1.1 lets the Node gateway reuse keep-alive connections
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(host="0.0.0.0", port=port, debug=True, threaded=True)
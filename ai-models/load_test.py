@@ -0,0 +1,296 @@
+"""
+Open-loop load generator for the AI Flask API:
+- Sends requests at a fixed arrival rate, whether or not earlier ones finished
+- Replays recorded usage vectors (CSV) or synthetic ones in the training ranges
+- Mixes /analyze, /summary and /jobs traffic, optionally through a local
+  stand-in for the Node gateway
+- Reports latency percentiles, throughput and errors per second and per rate
+"""
+
+import csv
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from modules.messages import from_message_ids
+from modules.validation import FEATURES
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Same ranges as preprocessing/create_expanded_dataset.py
+SYNTHETIC_RANGES = [(30, 600), (5, 120), (5, 80), (0, 300)]
+
+DEFAULT_MIX = {"analyze": 8, "summary": 1, "jobs": 1}
+
+
+def load_usage(csv_path=None, n=10000, seed=0):
+    """Usage vectors from a CSV with FEATURES columns, or synthetic ones."""
+    if csv_path:
+        with open(csv_path) as f:
+            return [[float(row[feature]) for feature in FEATURES] for row in csv.DictReader(f)]
+
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        screen = rng.randint(*SYNTHETIC_RANGES[0])
+        rows.append([screen, rng.randint(*SYNTHETIC_RANGES[1]), rng.randint(*SYNTHETIC_RANGES[2]),
+                     rng.randint(0, screen // 2)])
+    return rows
+
+
+class _Client:
+    """Keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def post(self, path, payload, timeout=30):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        body = json.dumps(payload)
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def _build_request(kind, usage, rng, job_rows):
+    if kind == "analyze":
+        return "/analyze", {"usage": rng.choice(usage)}
+    if kind == "summary":
+        return "/summary", {"usage": rng.choice(usage)}
+    if kind == "jobs":
+        return "/jobs", {"usage": rng.sample(usage, min(job_rows, len(usage)))}
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def run_open_loop(base_url, usage, rate, duration, mix=DEFAULT_MIX, poisson=True,
+                  max_workers=256, job_rows=1000, seed=0, gateway_url=None):
+    """
+    Offer `rate` requests/second for `duration` seconds.
+
+    Latency is measured from each request's scheduled send time, so time
+    spent waiting for a free worker counts (no coordinated omission).
+    With `gateway_url`, /analyze goes through the gateway as /api/analyze;
+    the gateway has no /summary or /jobs routes, so those still go to
+    `base_url`.
+
+    Returns
+    -------
+    list of (scheduled_offset, kind, latency_seconds, ok) tuples
+    """
+    rng = random.Random(seed)
+    client = _Client(base_url)
+    gateway = _Client(gateway_url) if gateway_url else None
+    kinds, weights = zip(*mix.items())
+    results = []
+    lock = threading.Lock()
+
+    def send(scheduled, kind, path, payload):
+        try:
+            status = (gateway if gateway and kind == "analyze" else client).post(path, payload)
+            ok = status < 400
+        except Exception:
+            ok = False
+        with lock:
+            results.append((scheduled - start, kind, time.perf_counter() - scheduled, ok))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    start = time.perf_counter()
+    scheduled = start
+    while scheduled - start < duration:
+        kind = rng.choices(kinds, weights)[0]
+        path, payload = _build_request(kind, usage, rng, job_rows)
+        if gateway and kind == "analyze":
+            path = "/api/analyze"
+
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        executor.submit(send, scheduled, kind, path, payload)
+        scheduled += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    executor.shutdown(wait=True)
+    return results
+
+
+def summarize(results, rate, duration):
+    """Overall latency percentiles, throughput and error rate for one run."""
+    latencies = np.array([latency for _, _, latency, ok in results if ok])
+    errors = sum(1 for *_, ok in results if not ok)
+    summary = {
+        "offered_rate": rate,
+        # Poisson arrivals send a random number of requests; this is what was actually sent
+        "sent_rate": round(len(results) / duration, 1),
+        "requests": len(results),
+        "throughput": round(len(latencies) / duration, 1),
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+    }
+    for name, q in (("p50_ms", 50), ("p90_ms", 90), ("p99_ms", 99), ("max_ms", 100)):
+        summary[name] = round(float(np.percentile(latencies, q)) * 1000, 1) if len(latencies) else None
+    return summary
+
+
+def timeline(results, interval=1.0):
+    """Per-interval throughput, error count and latency percentiles."""
+    buckets = {}
+    for offset, _, latency, ok in results:
+        buckets.setdefault(int(offset // interval), []).append((latency, ok))
+
+    rows = []
+    for bucket in sorted(buckets):
+        entries = buckets[bucket]
+        latencies = np.array([latency for latency, ok in entries if ok])
+        rows.append({
+            "t": bucket * interval,
+            "sent": len(entries),
+            "errors": sum(1 for _, ok in entries if not ok),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if len(latencies) else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1) if len(latencies) else None,
+        })
+    return rows
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    """
+    Forwards POST /api/analyze to Flask like routes/analyze.js (no auth or
+    Mongo): asks for message ids and expands them with a catalog fetched
+    once per catalog version.
+    """
+
+    protocol_version = "HTTP/1.1"
+    upstream = None
+    local = threading.local()
+    catalogs = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/analyze":
+            return self._send(404, b'{"error": true}', "application/json")
+
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(*self.upstream)
+
+        payload = {**json.loads(body or b"{}"), "message_ids": True}
+        language = self.headers.get("Accept-Language", "en")
+        try:
+            status, result = self._upstream(conn, "POST", "/analyze", payload, language)
+            version = result.pop("catalog_version", None) if isinstance(result, dict) else None
+            if version is not None:
+                if version not in self.catalogs:
+                    self.catalogs[version] = self._upstream(conn, "GET", "/messages", None, language)[1]["messages"]
+                result["recommendations"] = from_message_ids(result["recommendations"], self.catalogs[version])
+        except Exception:
+            conn.close()
+            self.local.conn = None
+            return self._send(502, b'{"error": true}', "application/json")
+
+        self._send(status, json.dumps(result).encode(), "application/json")
+
+    def _upstream(self, conn, method, path, payload, language):
+        headers = {"Accept-Language": language}
+        if msgpack is not None:
+            headers.update({"Content-Type": "application/msgpack", "Accept": "application/msgpack"})
+            body = None if payload is None else msgpack.packb(payload)
+        else:
+            headers["Content-Type"] = "application/json"
+            body = None if payload is None else json.dumps(payload)
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        if msgpack is not None and response.getheader("Content-Type", "").startswith("application/msgpack"):
+            return response.status, msgpack.unpackb(data)
+        return response.status, json.loads(data)
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_gateway(flask_url, port=0):
+    """Run the gateway stand-in on a background thread; returns its base URL."""
+    parts = urlsplit(flask_url)
+    handler = type("GatewayHandler", (_GatewayHandler,), {"upstream": (parts.hostname, parts.port or 80)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Open-loop load test for the AI models API")
+    parser.add_argument("--url", default=os.environ.get("FLASK_URL", "http://127.0.0.1:5000"))
+    parser.add_argument("--rates", default="10,25,50,100", help="Comma-separated offered rates (req/s)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per rate")
+    parser.add_argument("--replay", help="CSV of usage vectors to replay (FEATURES columns)")
+    parser.add_argument("--mix", default="analyze=8,summary=1,jobs=1",
+                        help="Request mix weights, e.g. analyze=9,summary=1")
+    parser.add_argument("--job-rows", type=int, default=1000, help="Rows per /jobs submission")
+    parser.add_argument("--constant", action="store_true", help="Constant inter-arrival times instead of Poisson")
+    parser.add_argument("--gateway", action="store_true",
+                        help="Send /analyze through a local Node-like gateway (/summary and /jobs go to --url)")
+    parser.add_argument("--timeline", action="store_true", help="Print per-second stats")
+    parser.add_argument("--out", help="Write all summaries and timelines as JSON")
+    args = parser.parse_args()
+
+    mix = {kind: float(weight) for kind, weight in (item.split("=") for item in args.mix.split(","))}
+    usage = load_usage(args.replay)
+    gateway_url = start_gateway(args.url) if args.gateway else None
+
+    print(f"\n{'='*70}")
+    target = f"{args.url} (/analyze via gateway {gateway_url})" if gateway_url else args.url
+    print(f"OPEN-LOOP LOAD TEST - {target} ({len(usage)} usage vectors, mix {mix})")
+    print(f"{'='*70}")
+    print(f"{'rate':>6} {'done/s':>8} {'errors':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+    report = []
+    for rate in (float(r) for r in args.rates.split(",")):
+        results = run_open_loop(args.url, usage, rate, args.duration, mix, poisson=not args.constant,
+                                job_rows=args.job_rows, gateway_url=gateway_url)
+        summary = summarize(results, rate, args.duration)
+        report.append({"summary": summary, "timeline": timeline(results)})
+
+        print(f"{rate:>6.0f} {summary['throughput']:>8} {summary['error_rate']:>8} {summary['p50_ms']!s:>9} "
+              f"{summary['p90_ms']!s:>9} {summary['p99_ms']!s:>9} {summary['max_ms']!s:>9}")
+        if args.timeline:
+            for row in report[-1]["timeline"]:
+                print(f"    t={row['t']:>5.0f}s sent={row['sent']} errors={row['errors']} "
+                      f"p50={row['p50_ms']} p99={row['p99_ms']}")
+
+        # Past saturation, latency only grows; stop climbing. Compared with the
+        # rate actually sent, so Poisson noise in the arrivals is not mistaken for it
+        if summary["throughput"] < 0.9 * summary["sent_rate"]:
+            print(f"\nSaturated at ~{summary['throughput']} req/s (sent {summary['sent_rate']})")
+            break
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
@@ -0,0 +1,256 @@
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from modules.clustering import FEATURES, LABELS, CONFIG_MANIFEST_PATH
+from modules.validation import validate_batch
+
+CHUNK_BYTES = 16 * 1024 * 1024   # CSV bytes parsed per task; bounds each worker's memory
+HISTOGRAM_BINS = 4096
+MAX_ITER = 100                  # 1-D k-means iterations on the score histogram
+MIN_LOADING = 0.1               # floor on standardized loadings, so no feature drops out of the score
+
+
+def _byte_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Header line and line-aligned (start, end) byte ranges covering a CSV."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()   # finish the line the seek landed in
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def _read_range(task):
+    """Valid usage rows of one byte range, and how many rows were rejected."""
+    path, header, start, end = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = pd.read_csv(io.BytesIO(header + data), usecols=FEATURES)[FEATURES].to_numpy(dtype=float)
+    _, _, codes = validate_batch(rows)
+    return rows[codes == 0], int((codes != 0).sum())
+
+
+def _moments(task):
+    rows, invalid = _read_range(task)
+    return {
+        "count": len(rows),
+        "invalid": invalid,
+        "sum": rows.sum(axis=0),
+        "outer": rows.T @ rows,
+        "max": rows.max(axis=0, initial=0),
+    }
+
+
+def _score_histogram(task, weights, edges):
+    rows, _ = _read_range(task)
+    return np.histogram(rows @ weights, bins=edges)[0]
+
+
+def _band_sums(task, weights, thresholds):
+    """Row count and feature sums per cluster band of the weighted score."""
+    rows, _ = _read_range(task)
+    bands = np.digitize(rows @ weights, thresholds)
+    k = len(thresholds) + 1
+    return {
+        "count": np.bincount(bands, minlength=k),
+        "sum": np.stack([np.bincount(bands, weights=rows[:, j], minlength=k)
+                         for j in range(len(FEATURES))], axis=1),
+    }
+
+
+def _merge(results):
+    """Sum per-task results (dicts of arrays or arrays); "max" entries are maxed."""
+    total = None
+    for result in results:
+        if total is None:
+            total = result
+        elif isinstance(result, dict):
+            for key, value in result.items():
+                total[key] = np.maximum(total[key], value) if key == "max" else total[key] + value
+        else:
+            total = total + result
+    return total
+
+
+def histogram_kmeans(counts, edges, k=len(LABELS), max_iter=MAX_ITER):
+    """
+    1-D k-means on a histogram (bin midpoints weighted by counts).
+
+    Returns
+    -------
+    tuple: (centers, thresholds) - sorted centers and the midpoints between them
+    """
+    mids = (edges[:-1] + edges[1:]) / 2
+    cdf = np.cumsum(counts) / counts.sum()
+    # Start from the middle quantile of each of k equal-count groups
+    centers = mids[np.searchsorted(cdf, (np.arange(k) + 0.5) / k)]
+    for _ in range(max_iter):
+        thresholds = (centers[:-1] + centers[1:]) / 2
+        bands = np.digitize(mids, thresholds)
+        weight = np.bincount(bands, weights=counts, minlength=k)
+        totals = np.bincount(bands, weights=counts * mids, minlength=k)
+        new_centers = np.where(weight > 0, totals / np.maximum(weight, 1), centers)
+        if np.allclose(new_centers, centers):
+            break
+        centers = np.sort(new_centers)
+    return centers, (centers[:-1] + centers[1:]) / 2
+
+
+class ClusterFitter:
+    """
+    Re-derive the clustering config (WEIGHTS, THRESHOLDS, REFERENCE_PATTERNS)
+    from usage CSVs of any size.
+
+    Every pass streams the files in CHUNK_BYTES byte ranges spread over a
+    process pool and returns only small per-range statistics, so peak memory
+    depends on the chunk size and worker count, not on the number of rows:
+
+    1. feature moments (sums and the 4x4 cross-product matrix)
+    2. weighted-score histogram, with weights from the first principal
+       component of the standardized features: the axis along which usage
+       varies most, which is what the score ranks users on
+    3. per-band feature sums for the reference patterns
+
+    Thresholds come from k-means on the streamed score histogram, so the
+    score bands are the k-means clusters of the score. A feature whose
+    loading on the component is below MIN_LOADING (e.g. one uncorrelated
+    with the others) is kept at MIN_LOADING rather than weighted 0; the fit
+    reports every loading and which features were floored.
+    """
+
+    def __init__(self, paths, workers=None, chunk_bytes=CHUNK_BYTES):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.tasks = []
+        for path in self.paths:
+            header, ranges = _byte_ranges(path, chunk_bytes)
+            self.tasks += [(path, header, start, end) for start, end in ranges]
+
+    def _map(self, pool, fn, **kwargs):
+        return _merge(pool.map(partial(fn, **kwargs), self.tasks))
+
+    def fit(self):
+        """
+        Returns
+        -------
+        dict : config with weights, thresholds and reference_patterns, plus
+        fit statistics
+        """
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            moments = self._map(pool, _moments)
+            n = moments["count"]
+            if n < len(LABELS):
+                raise ValueError(f"Not enough valid usage rows to fit {len(LABELS)} clusters: {n}")
+
+            mean = moments["sum"] / n
+            covariance = moments["outer"] / n - np.outer(mean, mean)
+            std = np.sqrt(np.maximum(np.diag(covariance), 1e-12))
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance / np.outer(std, std))
+            component = eigenvectors[:, -1] * np.sign(eigenvectors[:, -1].sum())
+            floored = [feature for feature, loading in zip(FEATURES, component) if loading < MIN_LOADING]
+            if floored:
+                print(f"Loadings below {MIN_LOADING} for {floored} "
+                      f"({', '.join(f'{l:.3f}' for l in component)}); flooring them at {MIN_LOADING}")
+            # Standardized loadings -> weights on raw minutes/counts, summing to 1
+            weights = np.maximum(component, MIN_LOADING) / std
+            weights /= weights.sum()
+
+            edges = np.linspace(0, float(moments["max"] @ weights), HISTOGRAM_BINS + 1)
+            histogram = self._map(pool, _score_histogram, weights=weights, edges=edges)
+            centers, thresholds = histogram_kmeans(histogram, edges)
+
+            bands = self._map(pool, _band_sums, weights=weights, thresholds=thresholds)
+
+        patterns = bands["sum"] / np.maximum(bands["count"], 1)[:, None]
+        return {
+            "features": FEATURES,
+            "weights": [round(float(w), 4) for w in weights],
+            "thresholds": {
+                "light_to_moderate": round(float(thresholds[0]), 2),
+                "moderate_to_heavy": round(float(thresholds[1]), 2),
+            },
+            "reference_patterns": {label: [int(round(v)) for v in patterns[i]] for i, label in enumerate(LABELS)},
+            "score_centers": [round(float(c), 2) for c in centers],
+            "cluster_sizes": {label: int(bands["count"][i]) for i, label in enumerate(LABELS)},
+            "loadings": {feature: round(float(loading), 4) for feature, loading in zip(FEATURES, component)},
+            "floored_features": floored,
+            "explained_variance": round(float(eigenvalues[-1] / eigenvalues.sum()), 4),
+            "rows": int(n),
+            "invalid_rows": int(moments["invalid"]),
+            "sources": [os.path.basename(path) for path in self.paths],
+        }
+
+
+def publish(config, make_current=True, note=None, manifest_path=CONFIG_MANIFEST_PATH):
+    """
+    Save a fitted config as a new version.
+
+    Returns
+    -------
+    str : the new version id, loadable with clustering.load_config(version)
+    """
+    manifest = {"current": None, "versions": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    version = f"v{len(manifest['versions']) + 1}"
+    created = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    configs_dir = os.path.join(os.path.dirname(manifest_path), "cluster_configs")
+    os.makedirs(configs_dir, exist_ok=True)
+    filename = f"cluster_config_{version}.json"
+    with open(os.path.join(configs_dir, filename), "w") as f:
+        json.dump({"version": version, "created": created, **config}, f, indent=2)
+
+    manifest["versions"][version] = {
+        "path": os.path.join("cluster_configs", filename),
+        "created": created,
+        "rows": config["rows"],
+        "thresholds": config["thresholds"],
+        "note": note,
+    }
+    if make_current:
+        manifest["current"] = version
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit cluster weights, thresholds and reference patterns")
+    parser.add_argument("csv", nargs="*", default=[os.path.join(os.path.dirname(__file__), "..",
+                                                                "preprocessing", "expanded_dataset.csv")])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2 ** 20)
+    parser.add_argument("--publish", action="store_true", help="Publish the result as the current config")
+    args = parser.parse_args()
+
+    fitter = ClusterFitter(args.csv, workers=args.workers, chunk_bytes=int(args.chunk_mb * 2 ** 20))
+    config = fitter.fit()
+    print(json.dumps(config, indent=2))
+    for feature in FEATURES:
+        note = " (floored)" if feature in config["floored_features"] else ""
+        print(f"{feature:>18}: loading {config['loadings'][feature]:+.4f} -> weight "
+              f"{config['weights'][FEATURES.index(feature)]:.4f}{note}")
+    if args.publish:
+        print(f"Published cluster config {publish(config)}")
@@ -1,7 +1,13 @@
+import json
+import os
+
 import numpy as np
 import pandas as pd
 
-FEATURES = ["daily_screen_time", "session_duration", "app_switches", "night_activity"]
+from modules.messages import Message
+from modules.validation import FEATURES, validate
+
+LABELS = ["light", "moderate", "heavy"]
 
 # Feature weights (emphasize screen time, consider others)
 WEIGHTS = np.array([0.5, 0.2, 0.2, 0.1])
@@ -13,6 +19,79 @@ THRESHOLDS = {
     "moderate_to_heavy": 250,    # ~4+ hours daily screen time weighted
 }
 
+# Typical usage per cluster, based on user behaviors and medical guidelines
+REFERENCE_PATTERNS = {
+    "light": [120, 15, 20, 10],      # ~2 hours, healthy usage
+    "moderate": [240, 25, 35, 30],    # ~4 hours, manageable
+    "heavy": [420, 40, 60, 80],       # ~7 hours, concerning
+}
+
+# Configs fitted on full usage data (see modules/cluster_fitting.py) are listed
+# here; without one, the hand-tuned values above are used
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "trained_models")
+CONFIG_MANIFEST_PATH = os.path.join(MODEL_DIR, "cluster_config_versions.json")
+BASELINE_CONFIG = "baseline"
+_BASELINE = {
+    "weights": WEIGHTS.tolist(),
+    "thresholds": dict(THRESHOLDS),
+    "reference_patterns": dict(REFERENCE_PATTERNS),
+}
+
+# Insight templates (catalog ids "insight.<key>"); {0} is the user's value for the feature
+INSIGHTS = {
+    "screen_time.high": "Your daily screen time ({0} min) is quite high. Consider setting a daily limit.",
+    "screen_time.moderate": "Your screen time ({0} min) is moderate. Try reducing by 30 min/day.",
+    "screen_time.healthy": "Your screen time ({0} min) is in a healthy range!",
+    "session_duration.long": "Long sessions ({0} min) can lead to fatigue. Take breaks every 25-30 minutes.",
+    "app_switches.high": "High app switching ({0}/day) may indicate distraction. Try focused time blocks.",
+    "night_activity.high": "Night usage ({0} min) can affect sleep. Set a 'digital sunset' 1 hour before bed.",
+    "night_activity.moderate": "Consider reducing nighttime usage ({0} min) for better sleep quality.",
+}
+
+
+def resolve_config_version(version=None):
+    """
+    Find the file for a cluster config version.
+    
+    With no version, the manifest's "current" entry is used if one has been
+    published, otherwise the hand-tuned baseline.
+    
+    Returns
+    -------
+    tuple: (version, path), path is None for the baseline
+    """
+    manifest = {}
+    if os.path.exists(CONFIG_MANIFEST_PATH):
+        with open(CONFIG_MANIFEST_PATH) as f:
+            manifest = json.load(f)
+    
+    version = version or manifest.get("current") or BASELINE_CONFIG
+    if version == BASELINE_CONFIG:
+        return version, None
+    if version not in manifest.get("versions", {}):
+        raise ValueError(f"Unknown cluster config version: {version}")
+    return version, os.path.join(MODEL_DIR, manifest["versions"][version]["path"])
+
+
+def load_config(version=None):
+    """Load (or hot-swap to) the weights, thresholds and reference patterns of a config version."""
+    global WEIGHTS, THRESHOLDS, REFERENCE_PATTERNS, CONFIG_VERSION
+    CONFIG_VERSION, path = resolve_config_version(version)
+    config = _BASELINE
+    if path is not None:
+        with open(path) as f:
+            config = json.load(f)
+        if config.get("features") != FEATURES:
+            raise ValueError(f"Cluster config {CONFIG_VERSION} was fitted for features {config.get('features')}")
+    
+    WEIGHTS = np.array(config["weights"], dtype=float)
+    THRESHOLDS = dict(config["thresholds"])
+    REFERENCE_PATTERNS = {label: list(pattern) for label, pattern in config["reference_patterns"].items()}
+    return config
+
+
+load_config(os.environ.get("CLUSTER_CONFIG_VERSION"))
+
 
 def calculate_usage_score(user_data):
     """
@@ -27,8 +106,7 @@ def calculate_usage_score(user_data):
     -------
     float : Weighted usage score
     """
-    if len(user_data) != len(FEATURES):
-        raise ValueError(f"Expected {len(FEATURES)} features: {FEATURES}, got {len(user_data)}")
+    user_data = validate(user_data)
     
     return np.dot(user_data, WEIGHTS)
 
@@ -53,8 +131,7 @@ def predict_cluster(user_data):
         score (float) : weighted usage score (for transparency)
         breakdown (dict) : contribution of each feature
     """
-    if len(user_data) != len(FEATURES):
-        raise ValueError(f"Expected {len(FEATURES)} features: {FEATURES}, got {len(user_data)}")
+    user_data = validate(user_data)
     
     score = calculate_usage_score(user_data)
     
@@ -83,55 +160,76 @@ def predict_cluster(user_data):
     }
 
 
+def predict_cluster_batch(rows):
+    """
+    Vectorized predict_cluster for many users at once.
+    
+    Parameters
+    ----------
+    rows : array-like, shape (n, 4)
+        [daily_screen_time, session_duration, app_switches, night_activity] rows
+    
+    Returns
+    -------
+    tuple: (clusters, scores) arrays of shape (n,)
+    """
+    rows = np.asarray(rows, dtype=float).reshape(-1, len(FEATURES))
+    scores = rows @ WEIGHTS
+    clusters = np.digitize(scores, [THRESHOLDS["light_to_moderate"], THRESHOLDS["moderate_to_heavy"]])
+    return clusters, scores
+
+
 def get_cluster_centers():
     """
-    Return reference usage patterns for each cluster.
-    These are based on typical user behaviors and medical guidelines.
+    Return reference usage patterns for each cluster, from the loaded
+    config (REFERENCE_PATTERNS).
     """
-    reference_patterns = {
-        "light": [120, 15, 20, 10],      # ~2 hours, healthy usage
-        "moderate": [240, 25, 35, 30],    # ~4 hours, manageable
-        "heavy": [420, 40, 60, 80],       # ~7 hours, concerning
-    }
-    
-    df = pd.DataFrame.from_dict(reference_patterns, orient='index', columns=FEATURES)
+    df = pd.DataFrame.from_dict(REFERENCE_PATTERNS, orient='index', columns=FEATURES)
     df['weighted_score'] = df.apply(lambda row: calculate_usage_score(row.values), axis=1)
     
     return df
 
 
-def get_personalized_insights(user_data):
+def get_personalized_insights(user_data, cluster_result=None):
     """
     Provide actionable insights based on user's specific usage pattern.
     
+    Parameters
+    ----------
+    user_data : list or array
+    cluster_result : dict, optional
+        predict_cluster() result for user_data, if the caller already has it
+    
     Returns
     -------
-    dict with personalized messages about each feature
+    dict with personalized messages (messages.Message, rendered on
+    serialization or str()) about each feature
     """
-    result = predict_cluster(user_data)
+    user_data = validate(user_data)
+    result = cluster_result or predict_cluster(user_data)
     insights = []
     
     # Screen time insight
     if user_data[0] > 300:
-        insights.append(f"Your daily screen time ({user_data[0]} min) is quite high. Consider setting a daily limit.")
+        insights.append(Message("insight.screen_time.high", user_data[0]))
     elif user_data[0] > 180:
-        insights.append(f"Your screen time ({user_data[0]} min) is moderate. Try reducing by 30 min/day.")
+        insights.append(Message("insight.screen_time.moderate", user_data[0]))
     else:
-        insights.append(f"Your screen time ({user_data[0]} min) is in a healthy range!")
+        insights.append(Message("insight.screen_time.healthy", user_data[0]))
     
     # Session duration insight
     if user_data[1] > 30:
-        insights.append(f"Long sessions ({user_data[1]} min) can lead to fatigue. Take breaks every 25-30 minutes.")
+        insights.append(Message("insight.session_duration.long", user_data[1]))
     
     # App switches insight
     if user_data[2] > 50:
-        insights.append(f"High app switching ({user_data[2]}/day) may indicate distraction. Try focused time blocks.")
+        insights.append(Message("insight.app_switches.high", user_data[2]))
     
     # Night activity insight
     if user_data[3] > 60:
-        insights.append(f"Night usage ({user_data[3]} min) can affect sleep. Set a 'digital sunset' 1 hour before bed.")
+        insights.append(Message("insight.night_activity.high", user_data[3]))
     elif user_data[3] > 30:
-        insights.append(f"Consider reducing nighttime usage ({user_data[3]} min) for better sleep quality.")
+        insights.append(Message("insight.night_activity.moderate", user_data[3]))
     
     return {
         **result,
@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeRegressor
+
+from modules.clustering import FEATURES
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "trained_models")
+COMPACT_MODEL_PATH = os.path.join(MODEL_DIR, "rf_addiction_compact.npz")
+
+# Grid covers the synthetic training ranges with some margin on each side
+GRID = {
+    "daily_screen_time": np.linspace(0, 720, 49),
+    "session_duration": np.linspace(0, 150, 31),
+    "app_switches": np.linspace(0, 100, 21),
+    "night_activity": np.linspace(0, 360, 25),
+}
+
+MAX_DEPTH = 10
+MIN_SAMPLES_LEAF = 20
+
+
+class CompactTree:
+    """
+    Single regression tree stored as flat arrays, predicting P(addicted).
+
+    Works on raw usage values (no scaler), and a single row is scored with a
+    short Python loop instead of going through sklearn's input validation.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, meta=None):
+        self.feature = np.asarray(feature, dtype=np.int8)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.meta = meta or {}
+        # Plain lists are the fastest thing to index from Python
+        self._nodes = list(zip(self.feature.tolist(), self.threshold.tolist(),
+                               self.left.tolist(), self.right.tolist(), self.value.tolist()))
+
+    @classmethod
+    def from_sklearn(cls, tree, meta=None):
+        t = tree.tree_
+        is_leaf = t.children_left < 0
+        return cls(
+            feature=np.where(is_leaf, -1, t.feature),
+            threshold=np.where(is_leaf, 0, t.threshold),
+            left=t.children_left,
+            right=t.children_right,
+            value=np.clip(t.value[:, 0, 0], 0, 1),
+            meta=meta,
+        )
+
+    @classmethod
+    def load(cls, path=COMPACT_MODEL_PATH):
+        data = np.load(path)
+        return cls(data["feature"], data["threshold"], data["left"], data["right"],
+                   data["value"], meta=json.loads(str(data["meta"])))
+
+    def save(self, path=COMPACT_MODEL_PATH):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                 right=self.right, value=self.value, meta=json.dumps(self.meta))
+
+    def predict_one(self, user_data):
+        """P(addicted) for a single [screen_time, session, switches, night] row."""
+        nodes = self._nodes
+        feature, threshold, left, right, value = nodes[0]
+        while feature >= 0:
+            node = left if user_data[feature] <= threshold else right
+            feature, threshold, left, right, value = nodes[node]
+        return value
+
+    def predict_proba(self, X):
+        """Vectorized P(addicted) for an (n, 4) array, one tree level per step."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, len(FEATURES))
+        node = np.zeros(len(X), dtype=np.int64)
+        active = self.feature[node] >= 0
+        while active.any():
+            rows = np.flatnonzero(active)
+            current = node[rows]
+            go_left = X[rows, self.feature[current]] <= self.threshold[current]
+            node[rows] = np.where(go_left, self.left[current], self.right[current])
+            active[rows] = self.feature[node[rows]] >= 0
+        return self.value[node]
+
+
+def synthetic_grid(grid=GRID):
+    """Every combination of the grid values, as an (n, 4) array."""
+    mesh = np.meshgrid(*[grid[feature] for feature in FEATURES], indexing="ij")
+    return np.column_stack([axis.ravel() for axis in mesh])
+
+
+def teacher_probability(teacher, X, chunk_size=100_000):
+    probs = [teacher.predict_proba(pd.DataFrame(X[i:i + chunk_size], columns=FEATURES))[:, 1]
+             for i in range(0, len(X), chunk_size)]
+    return np.concatenate(probs)
+
+
+def fidelity(student, teacher, n_samples=20000, seed=0):
+    """
+    Compare the compact model with the teacher on random in-range usage.
+
+    Returns
+    -------
+    dict with mean/max absolute probability error and label agreement
+    """
+    rng = np.random.default_rng(seed)
+    lower = [grid.min() for grid in GRID.values()]
+    upper = [grid.max() for grid in GRID.values()]
+    X = rng.uniform(lower, upper, (n_samples, len(FEATURES)))
+
+    expected = teacher_probability(teacher, X)
+    actual = student.predict_proba(X)
+    error = np.abs(actual - expected)
+    return {
+        "mean_abs_error": round(float(error.mean()), 4),
+        "max_abs_error": round(float(error.max()), 4),
+        "label_agreement": round(float(np.mean((actual > 0.5) == (expected > 0.5))), 4),
+    }
+
+
+def distill(teacher, max_depth=MAX_DEPTH, min_samples_leaf=MIN_SAMPLES_LEAF, teacher_version=None):
+    """
+    Fit a compact tree to the teacher's probabilities on the synthetic grid.
+
+    Returns
+    -------
+    CompactTree with fidelity figures in its meta
+    """
+    X = synthetic_grid()
+    y = teacher_probability(teacher, X)
+
+    tree = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=42)
+    tree.fit(X, y)
+
+    student = CompactTree.from_sklearn(tree, meta={
+        "teacher_version": teacher_version,
+        "max_depth": max_depth,
+        "nodes": int(tree.tree_.node_count),
+        "grid_size": len(X),
+    })
+    student.meta["fidelity"] = fidelity(student, teacher)
+    return student
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from modules import prediction
+
+    parser = argparse.ArgumentParser(description="Distill the addiction forest into a compact tree")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH)
+    parser.add_argument("--min-samples-leaf", type=int, default=MIN_SAMPLES_LEAF)
+    parser.add_argument("--out", default=COMPACT_MODEL_PATH)
+    args = parser.parse_args()
+
+    student = distill(prediction.model, args.max_depth, args.min_samples_leaf, prediction.MODEL_VERSION)
+    student.save(args.out)
+    print(f"Saved compact model ({student.meta['nodes']} nodes) to {args.out}")
+    print(f"Fidelity vs {prediction.MODEL_VERSION}: {student.meta['fidelity']}")
+
+    user = [400, 35, 60, 50]
+    for name, fn in (("forest", lambda: prediction.predict_addiction(user)),
+                     ("compact", lambda: prediction.predict_addiction(user, compact=True))):
+        start = time.perf_counter()
+        for _ in range(200):
+            fn()
+        print(f"{name}: {(time.perf_counter() - start) / 200 * 1e6:.0f} us per prediction")
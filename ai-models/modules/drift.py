@@ -0,0 +1,329 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from modules import prediction
+from modules.prediction import FEATURES
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; each process then keeps its own histograms
+    fcntl = None
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "..", "preprocessing", "expanded_dataset.csv")
+
+# Training ranges from preprocessing/create_expanded_dataset.py, plus the model output.
+# Values outside a range land in an underflow/overflow bin instead of being dropped.
+RANGES = {
+    "daily_screen_time": (30, 600),
+    "session_duration": (5, 120),
+    "app_switches": (5, 80),
+    "night_activity": (0, 300),
+    "probability": (0, 1),
+}
+N_BINS = 20
+
+# Sliding window: WINDOW_BUCKETS buckets of BUCKET_SECONDS each (1 hour by default)
+BUCKET_SECONDS = 300
+WINDOW_BUCKETS = 12
+
+# Conventional PSI bands
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+_EPS = 1e-4
+
+SHARED_NAME = os.environ.get("DRIFT_SHARED_NAME", "detox_drift")
+_MAGIC = 0x4445545844524654  # "DETXDRFT"
+
+
+def psi(expected, actual):
+    """Population stability index between two histograms (counts or fractions)."""
+    e = np.asarray(expected, dtype=float)
+    a = np.asarray(actual, dtype=float)
+    e = np.clip(e / max(e.sum(), 1), _EPS, None)
+    a = np.clip(a / max(a.sum(), 1), _EPS, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks_statistic(expected, actual):
+    """Kolmogorov-Smirnov distance between two histograms on the same bins."""
+    e = np.cumsum(expected) / max(np.sum(expected), 1)
+    a = np.cumsum(actual) / max(np.sum(actual), 1)
+    return float(np.max(np.abs(a - e)))
+
+
+class DriftMonitor:
+    """
+    Bounded-memory input drift monitor.
+
+    Every request adds one count per monitored value to fixed-width histograms
+    kept in a ring of time buckets, so memory is constant and each update is a
+    handful of array operations regardless of traffic.
+
+    With `shared_name`, the histograms live in named shared memory, so every
+    worker process on the host records into, and reports on, the same
+    histograms; updates are serialized with an fcntl lock, as in
+    result_cache. The reference histograms are recomputed whenever
+    prediction.MODEL_VERSION changes.
+    """
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, window_buckets=WINDOW_BUCKETS,
+                 n_bins=N_BINS, clock=time.time, shared_name=None):
+        self.names = list(RANGES)
+        self.lower = np.array([RANGES[name][0] for name in self.names], dtype=float)
+        self.upper = np.array([RANGES[name][1] for name in self.names], dtype=float)
+        self.n_bins = n_bins
+        self.width = (self.upper - self.lower) / n_bins
+
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        # +2 bins for underflow/overflow
+        hist_shape = (len(self.names), n_bins + 2)
+        shapes = {
+            "header": (5,),
+            "epoch": (1,),
+            "buckets": (window_buckets,) + hist_shape,
+            "window": hist_shape,
+            "lifetime": hist_shape,
+        }
+        layout = (_MAGIC, len(self.names), n_bins, window_buckets, bucket_seconds)
+        self._shm = None
+        self._lock_file = None
+        if shared_name is not None and fcntl is not None:
+            arrays = self._attach_shared(shared_name, shapes, layout)
+        else:
+            arrays = {name: np.zeros(shape, dtype=np.int64) for name, shape in shapes.items()}
+            arrays["header"][:] = layout
+            arrays["epoch"][0] = self._current_epoch()
+        self._epoch_cell = arrays["epoch"]
+        self.buckets, self.window, self.lifetime = arrays["buckets"], arrays["window"], arrays["lifetime"]
+
+        self._rows = np.arange(len(self.names))
+        self._lock = threading.Lock()
+        self._reference = None
+        self._reference_version = None
+
+    def _attach_shared(self, name, shapes, layout):
+        """Map the histograms onto the named segment, creating it if this is the first process."""
+        size = sum(int(np.prod(shape)) for shape in shapes.values()) * 8
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # The segment outlives any single worker; don't let the tracker unlink it on exit
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        arrays, offset = {}, 0
+        for key, shape in shapes.items():
+            arrays[key] = np.ndarray(shape, dtype=np.int64, buffer=self._shm.buf, offset=offset)
+            offset += arrays[key].nbytes
+        header = arrays["header"]
+        if created:
+            arrays["epoch"][0] = self._current_epoch()
+            header[1:] = layout[1:]
+            header[0] = layout[0]   # magic last: attaching processes wait for it
+        else:
+            # The creating process may not have written the header yet
+            for _ in range(100):
+                if header[0]:
+                    break
+                time.sleep(0.01)
+        if tuple(header) != layout:
+            raise ValueError(f"Shared memory {name!r} has an incompatible drift layout")
+
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+b")
+        return arrays
+
+    @contextmanager
+    def _locked(self):
+        # fcntl locks belong to the process, so threads take the threading.Lock first
+        with self._lock:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN)
+
+    @property
+    def _epoch(self):
+        return int(self._epoch_cell[0])
+
+    @_epoch.setter
+    def _epoch(self, value):
+        self._epoch_cell[0] = value
+
+    def _current_epoch(self):
+        return int(self.clock() // self.bucket_seconds)
+
+    def _advance(self):
+        """Expire buckets that fell out of the window since the last update."""
+        epoch = self._current_epoch()
+        if epoch <= self._epoch:
+            return
+        steps = min(epoch - self._epoch, len(self.buckets))
+        for step in range(1, steps + 1):
+            slot = (self._epoch + step) % len(self.buckets)
+            self.window -= self.buckets[slot]
+            self.buckets[slot] = 0
+        self._epoch = epoch
+
+    def bin_index(self, values):
+        """Map values, shaped (..., n_names), to histogram bins."""
+        values = np.asarray(values, dtype=float)
+        idx = np.floor((values - self.lower) / self.width).astype(int) + 1
+        # Upper bound of the range belongs to the last regular bin
+        idx = np.where(values == self.upper, self.n_bins, idx)
+        return np.clip(idx, 0, self.n_bins + 1)
+
+    def record(self, user_data, probability=None):
+        """
+        Add one request: the 4 usage features and the predicted addiction
+        probability. Pass probability=None when no model produced it (e.g. the
+        zero/low-usage shortcuts), so only the features are counted.
+        """
+        if probability is None:
+            rows = self._rows[:-1]
+            idx = self.bin_index([*user_data, 0.0])[:-1]
+        else:
+            rows = self._rows
+            idx = self.bin_index([*user_data, probability])
+        with self._locked():
+            self._advance()
+            slot = self._epoch % len(self.buckets)
+            self.buckets[slot, rows, idx] += 1
+            self.window[rows, idx] += 1
+            self.lifetime[rows, idx] += 1
+
+    def set_reference(self, rows):
+        """
+        Set the training distribution from an (n, 5) array of
+        [features..., probability] rows.
+        """
+        idx = self.bin_index(rows)
+        reference = np.zeros_like(self.window)
+        for col in range(len(self.names)):
+            reference[col] = np.bincount(idx[:, col], minlength=self.n_bins + 2)
+        self._reference = reference
+        self._reference_version = prediction.MODEL_VERSION
+
+    def reference(self):
+        """Training histograms, recomputed after a model hot-swap (prediction.load_model)."""
+        if self._reference is None or self._reference_version != prediction.MODEL_VERSION:
+            self.set_reference(_training_reference_rows())
+        return self._reference
+
+    def report(self):
+        """
+        Compare the sliding window and lifetime histograms against training.
+
+        Returns
+        -------
+        dict with per-value psi, ks, out_of_range share and a status label
+        """
+        reference = self.reference()
+        with self._locked():
+            self._advance()
+            window = self.window.copy()
+            lifetime = self.lifetime.copy()
+
+        features = {}
+        for i, name in enumerate(self.names):
+            count = int(window[i].sum())
+            value_psi = psi(reference[i], window[i]) if count else 0.0
+            if value_psi >= PSI_SIGNIFICANT:
+                status = "significant"
+            elif value_psi >= PSI_MODERATE:
+                status = "moderate"
+            else:
+                status = "stable"
+
+            features[name] = {
+                "psi": round(value_psi, 4),
+                "ks": round(ks_statistic(reference[i], window[i]), 4) if count else 0.0,
+                "lifetime_psi": round(psi(reference[i], lifetime[i]), 4) if lifetime[i].sum() else 0.0,
+                "out_of_range": round(float(window[i, 0] + window[i, -1]) / count, 4) if count else 0.0,
+                "status": status if count else "no_data",
+            }
+
+        return {
+            "window_seconds": self.bucket_seconds * len(self.buckets),
+            "window_count": int(window[0].sum()),
+            "lifetime_count": int(lifetime[0].sum()),
+            "model_version": self._reference_version,
+            "features": features,
+        }
+
+    def unlink(self):
+        """Remove the shared segment (e.g. on deployment teardown)."""
+        if self._shm is not None:
+            # unlink() unregisters from the resource tracker, so register it back first
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+
+
+def _training_reference_rows():
+    """Training features plus the loaded model's probabilities on them."""
+    df = pd.read_csv(DATASET_PATH)
+    probs = prediction.model.predict_proba(df[FEATURES])[:, 1]
+    return np.column_stack([df[FEATURES].values, probs])
+
+
+_monitor = None
+
+
+def get_monitor():
+    """Process-wide handle on the monitor shared by all workers on the host, fed by the API."""
+    global _monitor
+    if _monitor is None:
+        _monitor = DriftMonitor(shared_name=None if os.environ.get("DRIFT_SHARED_DISABLED") else SHARED_NAME)
+    return _monitor
+
+
+def _record_worker(name, n, seed):
+    # Demo helper: one "API worker" recording into the shared histograms
+    worker = DriftMonitor(shared_name=name)
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        worker.record([rng.integers(30, 600), rng.integers(5, 120), rng.integers(5, 80), rng.integers(0, 300)],
+                      rng.uniform(0, 1))
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    rng = np.random.default_rng(0)
+    demo = DriftMonitor()
+
+    # Traffic that drifts above the training screen time range
+    for _ in range(500):
+        usage = [rng.integers(300, 900), rng.integers(5, 120), rng.integers(5, 80), rng.integers(0, 150)]
+        demo.record(usage, rng.uniform(0.5, 1.0))
+
+    for name, stats in demo.report()["features"].items():
+        print(f"{name}: {stats}")
+
+    # Worker processes share one set of histograms
+    name = f"detox_drift_demo_{os.getpid()}"
+    shared = DriftMonitor(shared_name=name)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_record_worker, args=(name, 1000, seed)) for seed in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    report = shared.report()
+    print(f"4 workers recorded {report['window_count']} requests into one window "
+          f"(probability psi {report['features']['probability']['psi']})")
+    shared.unlink()
@@ -0,0 +1,591 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(__file__), "..", "history_data"))
+
+# Fixed-width columns, one file per column per segment.
+# user_id fits a Mongo ObjectId hex string; model_version a prediction.MODEL_VERSION.
+COLUMNS = [
+    ("user_id", "S24", ()),
+    ("timestamp", "<f8", ()),
+    ("usage", "<f4", (4,)),
+    ("cluster", "i1", ()),
+    ("prediction", "i1", ()),
+    ("probability", "<f4", ()),
+    ("model_version", "S16", ()),
+]
+RECORD_DTYPE = np.dtype([(name, dtype, shape) for name, dtype, shape in COLUMNS])
+
+USER_ID_BYTES = RECORD_DTYPE["user_id"].itemsize
+
+SEGMENT_ROWS = 1_000_000       # active segment is sealed once it reaches this size
+COMPACT_INTERVAL = 300         # seconds between background compaction passes
+MERGE_FACTOR = 4               # compacted segments of one size tier merged once there are this many
+MAX_MERGE_ROWS = 16 * SEGMENT_ROWS   # compacted segments this large are not merged again
+
+
+class _Segment:
+    """
+    One directory of column files.
+
+    Unsorted segments (active ones, and sealed ones awaiting compaction)
+    keep an in-memory user -> row positions index. Compacted segments are
+    sorted by (user_id, timestamp) and carry users.npy/offsets.npy, so a
+    user's rows are one contiguous slice found with a binary search.
+
+    An active segment has exactly one writer, whose pid is kept in its meta.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._maps = None
+        self._maps_rows = -1
+
+        if self.sorted:
+            self.users = np.load(os.path.join(path, "users.npy"))
+            self.offsets = np.load(os.path.join(path, "offsets.npy"))
+            self.rows = int(self.offsets[-1])
+        else:
+            self.rows = self._rows_on_disk()
+            self.positions = {}
+            for pos, user_id in enumerate(self.columns()["user_id"].tolist()):
+                self.positions.setdefault(user_id, []).append(pos)
+
+    @property
+    def sorted(self):
+        return self.meta["sorted"]
+
+    @property
+    def sealed(self):
+        return self.meta["sealed"]
+
+    @property
+    def orphaned(self):
+        """Active segment whose writer process is gone (or predates writer pids)."""
+        return not self.sealed and not _alive(self.meta.get("pid"))
+
+    @classmethod
+    def create(cls, path):
+        """New empty active segment in a reserved (empty) directory, written by this process."""
+        for name, _, _ in COLUMNS:
+            open(os.path.join(path, f"{name}.bin"), "wb").close()
+        # meta.json goes last; other processes skip directories without it
+        _write_meta(path, {"sealed": False, "sorted": False, "pid": os.getpid()})
+        return cls(path)
+
+    def reload_meta(self):
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    def _rows_on_disk(self):
+        # A torn append leaves some columns one row longer; trust the shortest
+        return min(os.path.getsize(os.path.join(self.path, f"{name}.bin")) // RECORD_DTYPE[name].itemsize
+                   for name, _, _ in COLUMNS)
+
+    def truncate(self):
+        """Drop a torn trailing row so every column file holds exactly `rows` items."""
+        for name, _, _ in COLUMNS:
+            with open(os.path.join(self.path, f"{name}.bin"), "r+b") as f:
+                f.truncate(self.rows * RECORD_DTYPE[name].itemsize)
+
+    def refresh(self):
+        """Index rows appended by the segment's writer since the last look (unsorted only)."""
+        if self.sorted:
+            return
+        # user_id is written first, so an unchanged user_id file means no new rows
+        if os.path.getsize(os.path.join(self.path, "user_id.bin")) // RECORD_DTYPE["user_id"].itemsize == self.rows:
+            return
+        rows = self._rows_on_disk()
+        if rows <= self.rows:
+            return
+        first, self.rows = self.rows, rows
+        for pos, user_id in enumerate(self.columns()["user_id"][first:rows].tolist(), start=first):
+            self.positions.setdefault(user_id, []).append(pos)
+
+    def seal(self):
+        """Mark an unsorted segment complete: no more appends, ready for compaction."""
+        self.refresh()
+        self.truncate()
+        self.meta["sealed"] = True
+        self.meta["timestamps"] = _time_bounds(self.columns()["timestamp"])
+        _write_meta(self.path, self.meta)
+
+    def outside(self, start=None, end=None):
+        """True if the segment is sealed and none of its rows can fall within [start, end]."""
+        bounds = self.meta.get("timestamps") if self.sealed else None
+        if not bounds:
+            return False
+        return (start is not None and bounds[1] < start) or (end is not None and bounds[0] > end)
+
+    def columns(self):
+        """Memory-mapped column arrays covering the current rows."""
+        if self._maps_rows != self.rows:
+            self._maps = {}
+            for name, _, _ in COLUMNS:
+                dtype = RECORD_DTYPE[name]
+                if self.rows == 0:
+                    self._maps[name] = np.zeros((0,) + dtype.shape, dtype=dtype.base)
+                    continue
+                self._maps[name] = np.memmap(os.path.join(self.path, f"{name}.bin"), mode="r",
+                                             dtype=dtype.base, shape=(self.rows,) + dtype.shape)
+            self._maps_rows = self.rows
+        return self._maps
+
+    def take(self, rows):
+        """Gather rows (slice or positions) into a RECORD_DTYPE array."""
+        columns = self.columns()
+        first = columns["user_id"][rows]
+        out = np.empty(len(first), dtype=RECORD_DTYPE)
+        for name, _, _ in COLUMNS:
+            out[name] = columns[name][rows]
+        return out
+
+    def user_rows(self, user_id, start=None, end=None):
+        """A user's rows in this segment, oldest first, within [start, end]."""
+        if self.sorted:
+            i = np.searchsorted(self.users, user_id)
+            if i == len(self.users) or self.users[i] != user_id:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+            timestamps = self.columns()["timestamp"][lo:hi]
+            a = lo if start is None else lo + int(np.searchsorted(timestamps, start, "left"))
+            b = hi if end is None else lo + int(np.searchsorted(timestamps, end, "right"))
+            return self.take(slice(a, b))
+
+        positions = self.positions.get(user_id)
+        if not positions:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        records = self.take(np.asarray(positions))
+        records = records[np.argsort(records["timestamp"], kind="stable")]
+        if start is not None:
+            records = records[records["timestamp"] >= start]
+        if end is not None:
+            records = records[records["timestamp"] <= end]
+        return records
+
+
+def encode_user_id(user_id):
+    """
+    user_id as stored in the user_id column.
+
+    Raises ValueError for ids longer than USER_ID_BYTES, which the fixed-width
+    column would silently cut short (merging users that share a prefix).
+    """
+    encoded = str(user_id).encode()
+    if not encoded or len(encoded) > USER_ID_BYTES:
+        raise ValueError(f"user_id must be 1 to {USER_ID_BYTES} bytes long")
+    return encoded
+
+
+def _time_bounds(timestamps):
+    """[min, max] timestamp of a sealed segment, kept in its meta so scans can skip it."""
+    if not len(timestamps):
+        return None
+    return [float(timestamps.min()), float(timestamps.max())]
+
+
+def _tier(rows):
+    """Size tier of a compacted segment: segments within a factor MERGE_FACTOR share a tier."""
+    return int(np.log(max(rows, 1)) / np.log(MERGE_FACTOR))
+
+
+def _alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_meta(path, meta):
+    tmp_path = os.path.join(path, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+
+class HistoryStore:
+    """
+    Append-only store of analysis results, segmented into column files.
+
+    Several processes (API workers) can open the same directory. Each store
+    appends only to its own active segment, created on its first append, so
+    row positions are never shared between writers. Reads re-list the
+    directory first, picking up other writers' segments and the rows they
+    appended since. Full segments are sealed and later compacted (sorted by
+    user and time) by `compact()`, which can run on a background thread while
+    reads and appends continue; a lock file lets only one process compact at
+    a time. Compacted segments are merged again size-tiered, MERGE_FACTOR of
+    a size at a time, so the number of segments a read visits grows with the
+    log of the history size rather than with the number of compactions.
+    """
+
+    def __init__(self, path=HISTORY_DIR, segment_rows=SEGMENT_ROWS):
+        self.path = path
+        self.segment_rows = segment_rows
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._files = None
+        self._active = None
+        self.segments = []
+        os.makedirs(path, exist_ok=True)
+
+        with self._lock:
+            self._refresh()
+        for segment in self.segments:
+            # Writers that died left their segment active, possibly with a torn last row
+            if segment.orphaned:
+                segment.seal()
+        # Inputs of a finished compaction may survive a crash before their removal
+        merged = {name for segment in self.segments for name in segment.meta.get("merged_from", [])}
+        for name in merged:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    def _refresh(self):
+        """Sync self.segments with the directory; call with self._lock held."""
+        known = {segment.name: segment for segment in self.segments}
+        segments = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.startswith("seg-"):
+                continue
+            segment = known.get(name)
+            if segment is None:
+                try:
+                    segment = _Segment(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    # No meta.json yet: a segment being created or an unfinished compaction
+                    continue
+            segments.append(segment)
+
+        merged = {name for segment in segments for name in segment.meta.get("merged_from", [])}
+        self.segments = [segment for segment in segments if segment.name not in merged]
+        for segment in self.segments:
+            if segment is not self._active:
+                try:
+                    segment.refresh()
+                except FileNotFoundError:
+                    pass   # compacted away meanwhile; already-mapped rows stay readable
+
+    def _reserve_segment_path(self):
+        """Create the next free segment directory; makedirs fails if another process took it."""
+        while True:
+            numbers = [int(name[4:]) for name in os.listdir(self.path) if name.startswith("seg-")]
+            path = os.path.join(self.path, f"seg-{max(numbers, default=0) + 1:06d}")
+            try:
+                os.makedirs(path)
+                return path
+            except FileExistsError:
+                continue
+
+    @property
+    def active(self):
+        """This store's own segment, created on first append."""
+        if self._active is None:
+            self._active = _Segment.create(self._reserve_segment_path())
+            self.segments.append(self._active)
+        return self._active
+
+    def _open_files(self):
+        if self._files is None:
+            self._files = {name: open(os.path.join(self.active.path, f"{name}.bin"), "ab")
+                           for name, _, _ in COLUMNS}
+        return self._files
+
+    def _seal_active(self):
+        for f in self._open_files().values():
+            f.close()
+        self._files = None
+        self.active.seal()
+        self._active = None
+
+    def append(self, user_id, usage, cluster, prediction, probability, model_version, timestamp=None):
+        """Record one analysis result."""
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["user_id"] = encode_user_id(user_id)
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["usage"] = usage
+        record["cluster"] = cluster
+        record["prediction"] = prediction
+        record["probability"] = probability
+        record["model_version"] = str(model_version or "").encode()
+
+        with self._lock:
+            files = self._open_files()
+            for name, _, _ in COLUMNS:
+                files[name].write(record[name].tobytes())
+                files[name].flush()
+
+            segment = self.active
+            segment.positions.setdefault(record["user_id"][0], []).append(segment.rows)
+            segment.rows += 1
+            if segment.rows >= self.segment_rows:
+                self._seal_active()
+
+    def _current_segments(self):
+        with self._lock:
+            self._refresh()
+            return list(self.segments)
+
+    def range(self, user_id, start=None, end=None):
+        """
+        All of a user's analyses with start <= timestamp <= end, oldest first.
+
+        Returns
+        -------
+        numpy structured array with RECORD_DTYPE fields
+        """
+        user_id = encode_user_id(user_id)
+        parts = [segment.user_rows(user_id, start, end) for segment in self._current_segments()]
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+        return records[np.argsort(records["timestamp"], kind="stable")]
+
+    def last(self, user_id, n=10):
+        """A user's n most recent analyses, oldest first."""
+        user_id = encode_user_id(user_id)
+        # Each segment contributes at most its own last n rows for the user
+        parts = [segment.user_rows(user_id)[-n:] for segment in self._current_segments()]
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+        return records[np.argsort(records["timestamp"], kind="stable")][-n:]
+
+    def scan(self, start=None, end=None, fields=("user_id", "timestamp", "usage")):
+        """
+        Every analysis with start <= timestamp <= end, one segment at a time.
+
+        Sealed segments whose [min, max] timestamps lie outside the range are
+        skipped without reading their files.
+
+        Yields
+        ------
+        dict of column arrays (only `fields`) per segment, in storage order
+        """
+        for segment in self._current_segments():
+            if segment.outside(start, end):
+                continue
+            columns = segment.columns()
+            timestamps = columns["timestamp"]
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps <= end
+            if mask.any():
+                yield {name: np.asarray(columns[name][mask]) for name in fields}
+
+    def _pick_merge(self):
+        """
+        Segments for the next merge; call with self._lock held.
+
+        Every sealed unsorted segment, plus all compacted segments of any size
+        tier that has reached MERGE_FACTOR segments.
+        """
+        pending, tiers = [], {}
+        for segment in self.segments:
+            if segment is self._active:
+                continue
+            if segment.sorted:
+                if segment.rows < MAX_MERGE_ROWS:
+                    tiers.setdefault(_tier(segment.rows), []).append(segment)
+                continue
+            # Other writers seal their segments on disk
+            segment.reload_meta()
+            if segment.orphaned:
+                segment.seal()
+            if segment.sealed:
+                segment.refresh()
+                pending.append(segment)
+        for tier in tiers.values():
+            if len(tier) >= MERGE_FACTOR:
+                pending += tier
+        return pending
+
+    def compact(self):
+        """
+        Sort sealed, unsorted segments into compacted ones, and merge compacted
+        segments tier by tier, until no tier is full.
+
+        Returns
+        -------
+        int : number of segments merged
+        """
+        with self._compact_lock, open(os.path.join(self.path, "compact.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0   # another process is compacting
+
+            total = 0
+            while True:
+                with self._lock:
+                    self._refresh()
+                    pending = self._pick_merge()
+                    # A lone compacted segment is already in its final form
+                    if not pending or (len(pending) == 1 and pending[0].sorted):
+                        return total
+                    # Reserve the name so segments created meanwhile pick the next one
+                    target = self._reserve_segment_path()
+                self._merge(pending, target)
+                total += len(pending)
+
+    def _merge(self, pending, target):
+        """Write the rows of `pending` sorted into the reserved directory `target`, then drop them."""
+        records = np.concatenate([segment.take(slice(0, segment.rows)) for segment in pending])
+        records = records[np.lexsort((records["timestamp"], records["user_id"]))]
+
+        for name, _, _ in COLUMNS:
+            records[name].tofile(os.path.join(target, f"{name}.bin"))
+        users, first = np.unique(records["user_id"], return_index=True)
+        np.save(os.path.join(target, "users.npy"), users)
+        np.save(os.path.join(target, "offsets.npy"), np.append(first, len(records)).astype(np.int64))
+        _write_meta(target, {"sealed": True, "sorted": True, "timestamps": _time_bounds(records["timestamp"]),
+                             "merged_from": [segment.name for segment in pending]})
+        merged = _Segment(target)
+
+        with self._lock:
+            self.segments = [merged] + [s for s in self.segments if s not in pending]
+        for segment in pending:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def start_background_compaction(self, interval=COMPACT_INTERVAL):
+        """Run compact() every `interval` seconds on a daemon thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"History compaction failed: {e}")
+
+        thread = threading.Thread(target=loop, name="history-compaction", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self._lock:
+            if self._files:
+                for f in self._files.values():
+                    f.close()
+                self._files = None
+
+
+def to_dicts(records):
+    """JSON-friendly list of analyses from a RECORD_DTYPE array."""
+    return [
+        {
+            "timestamp": float(r["timestamp"]),
+            "usage": [round(float(v), 2) for v in r["usage"]],
+            "cluster": int(r["cluster"]),
+            "prediction": int(r["prediction"]),
+            "probability": round(float(r["probability"]), 2),
+            "model_version": r["model_version"].decode(),
+        }
+        for r in records
+    ]
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide store, opened on first use with background compaction."""
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+        _store.start_background_compaction()
+    return _store
+
+
+def _append_worker(path, worker, users, rounds, segment_rows):
+    # Demo helper: one "API worker" appending its own users, compacting as it goes
+    store = HistoryStore(path, segment_rows=segment_rows)
+    for day in range(rounds):
+        for user in users:
+            store.append(user, [worker, day, 0, 0], 0, 0, 0.0, "baseline", timestamp=day * 86400)
+        if day % 10 == 0:
+            store.compact()
+    store.close()
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    store = HistoryStore(tempfile.mkdtemp(), segment_rows=50_000)
+    users = [f"{i:024x}" for i in range(5000)]
+
+    start = time.perf_counter()
+    for day in range(40):
+        for user in users[:2500]:
+            store.append(user, rng.integers(30, 600, 4), rng.integers(0, 3), rng.integers(0, 2),
+                         rng.random(), "baseline", timestamp=day * 86400)
+    print(f"Appended 100000 analyses in {time.perf_counter() - start:.1f}s "
+          f"({len(store.segments)} segments)")
+
+    print(f"Compacted {store.compact()} segments -> {len(store.segments)} segments")
+
+    start = time.perf_counter()
+    for user in users[:1000]:
+        store.last(user, 7)
+    print(f"last(7): {(time.perf_counter() - start) / 1000 * 1000:.3f} ms per user")
+    print(to_dicts(store.range(users[0], start=35 * 86400)))
+
+    # Several processes appending to one directory, as API workers do
+    path = tempfile.mkdtemp()
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_append_worker,
+                               args=(path, w, [f"w{w}-{i}" for i in range(200)], 50, 3000))
+               for w in range(4)]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    reader = HistoryStore(path)
+    for w in range(4):
+        for i in range(0, 200, 20):
+            records = reader.range(f"w{w}-{i}")
+            assert len(records) == 50 and (records["usage"][:, 0] == w).all(), (w, i, len(records))
+            assert (records["usage"][:, 1] == np.arange(50)).all()
+    print(f"4 processes appended 40000 analyses in {time.perf_counter() - start:.1f}s; "
+          f"every user reads back exactly its own {len(records)} rows "
+          f"from {len(reader.segments)} segments")
+    reader.compact()
+    assert len(reader.range("w3-180")) == 50
+    print(f"After compaction: {len(reader.segments)} segments")
+
+    # Compacted segments are merged by size tier, so the count stays logarithmic
+    store = HistoryStore(tempfile.mkdtemp(), segment_rows=500)
+    counts = []
+    for compaction in range(200):
+        for i in range(500):
+            store.append(f"u{i % 300}", [compaction, i, 0, 0], 0, 0, 0.0, "baseline",
+                         timestamp=compaction * 1000 + i)
+        store.compact()
+        counts.append(len(store.segments))
+    print(f"200 compactions of 500 rows: at most {max(counts)} segments, "
+          f"now {sorted(segment.rows for segment in store.segments)} rows each")
+
+    try:
+        store.append("auth0|1234567890abcdef12345678", [1, 1, 1, 1], 0, 0, 0.0, "baseline")
+    except ValueError as e:
+        print(f"Long user_id rejected: {e}")
+
+    a, b = HistoryStore(path), HistoryStore(path)
+    a.append("u1", [1, 1, 1, 1], 0, 0, 0.0, "baseline")
+    b.append("u2", [2, 2, 2, 2], 0, 0, 0.0, "baseline")
+    a.append("u1", [3, 3, 3, 3], 0, 0, 0.0, "baseline")
+    assert [r["usage"][0] for r in a.last("u1")] == [1, 3] and len(b.last("u1")) == 2
+    assert len(a.last("u2")) == 1
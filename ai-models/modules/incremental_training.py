@@ -0,0 +1,189 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from modules.prediction import FEATURES, MODEL_DIR, MANIFEST_PATH, resolve_model_version
+
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+
+TREES_PER_BATCH = 10    # trees grown on each mini-batch
+MAX_TREES = 200         # oldest trees are dropped beyond this, so the forest tracks recent behavior
+MIN_BATCH = 32          # labeled records buffered before an update
+
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"current": None, "versions": {}}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+class IncrementalTrainer:
+    """
+    Warm-start the addiction pipeline with streaming labeled usage records.
+
+    Each update grows `trees_per_batch` new trees on the buffered batch only,
+    so its cost depends on the batch size and not on the total history. The
+    existing scaler is reused and SMOTE is applied per batch when the minority
+    class is large enough, mirroring the notebook pipeline.
+
+    Every update reseeds the forest (and SMOTE) from `random_state`. With a
+    fixed seed, a forest trimmed back to max_trees would regrow trees at the
+    same positions with the same seeds on every update.
+    """
+
+    def __init__(self, version=None, trees_per_batch=TREES_PER_BATCH,
+                 max_trees=MAX_TREES, min_batch=MIN_BATCH, random_state=None):
+        self.parent_version, path = resolve_model_version(version)
+        # Own copy of the pipeline; the model served by modules.prediction is untouched
+        self.pipeline = joblib.load(path)
+        self.clf = self.pipeline.named_steps["clf"]
+        self.scaler = self.pipeline.named_steps["scaler"]
+        self.smote = self.pipeline.named_steps.get("smote")
+
+        self.trees_per_batch = trees_per_batch
+        self.max_trees = max_trees
+        self.min_batch = min_batch
+
+        self.samples_seen = 0
+        self.updates = 0
+        self._rng = np.random.default_rng(random_state)
+        self._buffer_X = []
+        self._buffer_y = []
+
+    def partial_fit(self, X, y):
+        """
+        Add labeled records and update the forest once a batch is ready.
+
+        Parameters
+        ----------
+        X : array-like, shape (n, 4)
+            [daily_screen_time, session_duration, app_switches, night_activity] rows
+        y : array-like, shape (n,)
+            0 = healthy, 1 = addicted
+
+        Returns
+        -------
+        bool : True if the forest was updated
+        """
+        X = np.asarray(X, dtype=float).reshape(-1, len(FEATURES))
+        y = np.asarray(y, dtype=int).ravel()
+        if len(X) != len(y):
+            raise ValueError(f"Got {len(X)} usage rows but {len(y)} labels")
+        if not np.isin(y, self.clf.classes_).all():
+            raise ValueError(f"Labels must be in {self.clf.classes_.tolist()}")
+
+        self._buffer_X.extend(X)
+        self._buffer_y.extend(y)
+
+        if len(self._buffer_y) >= self.min_batch:
+            return self.flush()
+        return False
+
+    def flush(self):
+        """Train on whatever is buffered, if it contains both classes."""
+        y = np.asarray(self._buffer_y, dtype=int)
+        # A single-class batch would reset the forest's classes_, so keep buffering
+        if len(np.unique(y)) < len(self.clf.classes_):
+            return False
+
+        X = pd.DataFrame(self._buffer_X, columns=FEATURES)
+        self._buffer_X, self._buffer_y = [], []
+        # Streamed records, not the SMOTE-resampled rows trained on
+        records = len(X)
+
+        minority = np.bincount(y).min()
+        if self.smote is not None and minority > self.smote.k_neighbors:
+            smote = clone(self.smote).set_params(random_state=self._seed())
+            X, y = smote.fit_resample(X, y)
+
+        X_scaled = self.scaler.transform(X)
+
+        self.clf.set_params(warm_start=True, random_state=self._seed(),
+                            n_estimators=len(self.clf.estimators_) + self.trees_per_batch)
+        self.clf.fit(X_scaled, y)
+
+        if len(self.clf.estimators_) > self.max_trees:
+            self.clf.estimators_ = self.clf.estimators_[-self.max_trees:]
+        self.clf.n_estimators = len(self.clf.estimators_)
+
+        self.samples_seen += records
+        self.updates += 1
+        return True
+
+    def _seed(self):
+        return int(self._rng.integers(2 ** 31 - 1))
+
+    def publish(self, make_current=True, note=None):
+        """
+        Save the current forest as a new model version.
+
+        Returns
+        -------
+        str : the new version id, loadable with prediction.load_model(version)
+        """
+        self.flush()
+        manifest = _read_manifest()
+        version = f"v{len(manifest['versions']) + 1}"
+
+        os.makedirs(VERSIONS_DIR, exist_ok=True)
+        filename = f"rf_addiction_{version}.pkl"
+        # Serving pickles must not keep growing on the next load
+        self.clf.warm_start = False
+        joblib.dump(self.pipeline, os.path.join(VERSIONS_DIR, filename))
+
+        manifest["versions"][version] = {
+            "path": os.path.join("versions", filename),
+            "parent": self.parent_version,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "n_estimators": len(self.clf.estimators_),
+            "samples_seen": self.samples_seen,
+            "updates": self.updates,
+            "note": note,
+        }
+        if make_current:
+            manifest["current"] = version
+        _write_manifest(manifest)
+
+        self.parent_version = version
+        return version
+
+
+def train_from_csv(csv_path, chunk_size=MIN_BATCH, version=None, publish=False):
+    """Stream a labeled dataset CSV through an IncrementalTrainer in chunks."""
+    trainer = IncrementalTrainer(version=version, min_batch=chunk_size)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        trainer.partial_fit(chunk[FEATURES].values, chunk["label"].values)
+
+    new_version = trainer.publish() if publish else None
+    return trainer, new_version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally update the addiction model")
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(__file__), "..",
+                                                      "preprocessing", "expanded_dataset.csv"))
+    parser.add_argument("--chunk-size", type=int, default=MIN_BATCH)
+    parser.add_argument("--version", help="Version to start from (default: current)")
+    parser.add_argument("--publish", action="store_true", help="Publish the result as a new version")
+    args = parser.parse_args()
+
+    trainer, new_version = train_from_csv(args.csv, args.chunk_size, args.version, args.publish)
+    print(f"Updates: {trainer.updates}, samples seen: {trainer.samples_seen}, "
+          f"trees: {len(trainer.clf.estimators_)}")
+    if new_version:
+        print(f"Published model version {new_version}")
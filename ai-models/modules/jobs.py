@@ -0,0 +1,325 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from modules.clustering import FEATURES
+
+# Job state and results live under JOBS_DIR, so any API worker process can
+# report on and page through a job that another worker is running.
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(os.path.dirname(__file__), "..", "jobs_data"))
+
+# Job workers run at lower CPU priority in their own processes, and only
+# MAX_INFLIGHT_CHUNKS chunks are in flight at once across every job and every
+# API worker on the host (see _Slots), so bulk work cannot crowd out
+# interactive /analyze requests. Each API worker starts its own pool on its
+# first job; pool processes without a slot stay idle.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+MAX_INFLIGHT_CHUNKS = int(os.environ.get("JOB_MAX_INFLIGHT_CHUNKS", JOB_WORKERS))
+JOB_NICE = 10
+CHUNK_SIZE = 1000
+MAX_JOB_ROWS = 1_000_000
+JOB_TTL = 3600                  # finished jobs (and their results) are dropped after this
+SLOT_POLL = 0.05                # seconds between attempts when every slot is taken
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+_STATE = ("total", "chunk_size", "created", "pid", "status", "error", "finished", "processed", "available")
+
+
+def _init_worker():
+    if hasattr(os, "nice"):
+        os.nice(JOB_NICE)
+
+
+def _score_chunk(rows):
+    """Runs in a worker process: cluster, predict and recommend one chunk."""
+    from modules.recommendation import recommend_batch
+    return recommend_batch(rows)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_json(path, value):
+    with open(path + ".tmp", "w") as f:
+        json.dump(value, f)
+    os.replace(path + ".tmp", path)
+
+
+class _Slots:
+    """
+    Host-wide counting semaphore: one flock'ed file per slot under JOBS_DIR.
+
+    Every acquire opens its own file description, so slots are exclusive
+    between threads as well as processes, and a crashed process's slots are
+    released by the kernel.
+    """
+
+    def __init__(self, path, count):
+        self.paths = [os.path.join(path, f"slot-{i}.lock") for i in range(count)]
+
+    def acquire(self):
+        while True:
+            for path in self.paths:
+                f = open(path, "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except BlockingIOError:
+                    f.close()
+            time.sleep(SLOT_POLL)
+
+    @staticmethod
+    def release(slot):
+        slot.close()
+
+
+class Job:
+    """A bulk-analysis job, persisted as JOBS_DIR/<job_id>/job.json plus one file per finished chunk."""
+
+    def __init__(self, total, chunk_size, job_id=None, created=None, pid=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.total = total
+        self.chunk_size = chunk_size
+        self.n_chunks = (total + chunk_size - 1) // chunk_size
+        self.status = "queued"
+        self.error = None
+        self.created = time.time() if created is None else created
+        self.finished = None
+        self.processed = 0
+        self.available = 0      # rows finished in order, i.e. up to the first unfinished chunk
+        self.pid = os.getpid() if pid is None else pid
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls(state["total"], state["chunk_size"], state["job_id"], state["created"], state["pid"])
+        for name in _STATE:
+            setattr(job, name, state[name])
+        # The API worker running the job exited before finishing it
+        if job.status in ("queued", "running") and not _alive(job.pid):
+            job.status = "failed"
+            job.error = job.error or "job worker exited"
+        return job
+
+    def state(self):
+        state = {name: getattr(self, name) for name in _STATE}
+        state["job_id"] = self.id
+        return state
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": round(self.processed / self.total, 4) if self.total else 1.0,
+            "failure": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs bulk-analysis jobs on a process pool and keeps their state and
+    results under JOBS_DIR for paginated retrieval from any API worker.
+    """
+
+    def __init__(self, path=JOBS_DIR, workers=JOB_WORKERS, max_inflight=MAX_INFLIGHT_CHUNKS,
+                 chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._slots = _Slots(path, max_inflight)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded web server is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a broken pool (e.g. a worker was killed) so the next job starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _job_path(self, job_id, name="job.json"):
+        return os.path.join(self.path, job_id, name)
+
+    def submit(self, rows):
+        """
+        Start scoring an (n, 4) array of usage rows.
+
+        Returns
+        -------
+        Job
+        """
+        rows = np.asarray(rows, dtype=float)
+        if rows.ndim != 2 or rows.shape[1] != len(FEATURES):
+            raise ValueError(f"Expected rows of {len(FEATURES)} features: {FEATURES}")
+        if len(rows) > MAX_JOB_ROWS:
+            raise ValueError(f"Jobs are limited to {MAX_JOB_ROWS} rows, got {len(rows)}")
+
+        os.makedirs(self.path, exist_ok=True)
+        self._expire()
+        job = Job(len(rows), self.chunk_size)
+        os.makedirs(os.path.join(self.path, job.id))
+        _write_json(self._job_path(job.id), job.state())
+
+        threading.Thread(target=self._dispatch, args=(job, rows), name=f"job-{job.id}", daemon=True).start()
+        return job
+
+    def _dispatch(self, job, rows):
+        try:
+            self._run_chunks(job, rows)
+        except Exception as e:
+            # Never leave a job "running" behind a live pid
+            job.error = job.error or str(e) or type(e).__name__
+        job.status = "failed" if job.error else "done"
+        job.finished = time.time()
+        _write_json(self._job_path(job.id), job.state())
+
+    def _run_chunks(self, job, rows):
+        """Score every chunk through the pool, at most max_inflight at once host-wide."""
+        executor = self._get_executor()
+        pending = threading.Semaphore(0)
+        state_lock = threading.Lock()
+        finished = [False] * job.n_chunks
+        with state_lock:
+            job.status = "running"
+            _write_json(self._job_path(job.id), job.state())
+
+        def on_done(future, index, slot):
+            try:
+                results = future.result()
+                _write_json(self._job_path(job.id, f"chunk-{index:06d}.json"), results)
+                with state_lock:
+                    finished[index] = True
+                    job.processed += len(results)
+                    while job.available < job.total and finished[job.available // job.chunk_size]:
+                        job.available = min(job.available + job.chunk_size, job.total)
+                    _write_json(self._job_path(job.id), job.state())
+            except Exception as e:
+                job.error = str(e)
+                if isinstance(e, BrokenExecutor):
+                    self._discard_executor(executor)
+            finally:
+                self._slots.release(slot)
+                pending.release()
+
+        for index in range(job.n_chunks):
+            slot = self._slots.acquire()
+            if job.error:
+                self._slots.release(slot)
+                pending.release()
+                continue
+            chunk = rows[index * job.chunk_size:(index + 1) * job.chunk_size]
+            try:
+                future = executor.submit(_score_chunk, chunk)
+            except Exception as e:
+                # e.g. BrokenProcessPool: no callback will run, so give the slot back here
+                job.error = str(e) or type(e).__name__
+                self._slots.release(slot)
+                pending.release()
+                if isinstance(e, BrokenExecutor):
+                    self._discard_executor(executor)
+                continue
+            future.add_done_callback(lambda f, i=index, s=slot: on_done(f, i, s))
+
+        for _ in range(job.n_chunks):
+            pending.acquire()
+
+    def _expire(self):
+        cutoff = time.time() - JOB_TTL
+        for job_id in os.listdir(self.path):
+            job = self.get(job_id)
+            # Jobs whose worker exited never get a finish time; they expire by age
+            ended = job and (job.finished or (job.status == "failed" and job.created))
+            if ended and ended < cutoff:
+                shutil.rmtree(os.path.join(self.path, job_id), ignore_errors=True)
+
+    def get(self, job_id):
+        """Job state from disk, or None for an unknown (or expired) job."""
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._job_path(job_id)) as f:
+                return Job.from_state(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def results(self, job_id, offset=0, limit=500):
+        """
+        A page of results, in input order.
+
+        Returns
+        -------
+        dict with results, next_offset (None when the job is done and exhausted)
+        and complete flag, or None for an unknown job
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        available = job.available
+        end = min(offset + limit, available)
+        page = []
+        if offset < end:
+            first, last = offset // job.chunk_size, (end - 1) // job.chunk_size
+            for index in range(first, last + 1):
+                base = index * job.chunk_size
+                lo, hi = max(offset - base, 0), min(end - base, job.chunk_size)
+                with open(self._job_path(job.id, f"chunk-{index:06d}.json")) as f:
+                    page.extend(json.load(f)[lo:hi])
+
+        finished = job.status in ("done", "failed")
+        exhausted = finished and end >= available
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "offset": offset,
+            "results": page,
+            "next_offset": None if exhausted else max(end, offset),
+            "complete": exhausted,
+        }
+
+
+manager = JobManager()
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    rows = np.column_stack([rng.integers(0, 700, 20000), rng.integers(0, 120, 20000),
+                            rng.integers(0, 90, 20000), rng.integers(0, 200, 20000)])
+
+    start = time.perf_counter()
+    job = manager.submit(rows)
+    while manager.get(job.id).status not in ("done", "failed"):
+        time.sleep(0.2)
+    print(f"{manager.get(job.id).to_dict()} in {time.perf_counter() - start:.1f}s")
+
+    page = manager.results(job.id, offset=0, limit=3)
+    for result in page["results"]:
+        print(result)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+LOCALES_DIR = os.path.join(os.path.dirname(__file__), "..", "locales")
+DEFAULT_LOCALE = "en"
+# Ids only ever rendered through Message; their texts are left out of the
+# text -> id lookups, so short labels never rewrite identical plain strings
+RENDER_ONLY_PREFIXES = ("report.",)
+
+
+class Message:
+    """
+    A catalog entry plus its parameters, formatted only when rendered.
+
+    Modules return these instead of f-strings, so a result holds one small
+    object per message; the text is produced in the caller's locale when the
+    response is serialized (see Catalog.localize). Templates use positional
+    fields ({0}, {1}) so parameters stay a plain tuple.
+    """
+
+    __slots__ = ("id", "params")
+
+    def __init__(self, message_id, *params):
+        self.id = message_id
+        self.params = params
+
+    def render(self, locale=DEFAULT_LOCALE):
+        return get_catalog(locale).render(self)
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return f"Message({', '.join(map(repr, (self.id, *self.params)))})"
+
+    def __eq__(self, other):
+        return isinstance(other, Message) and (self.id, self.params) == (other.id, other.params)
+
+    def __hash__(self):
+        return hash((self.id, self.params))
+
+
+def _build_base_catalog():
+    """Stable id for every constant recommendation string and message template."""
+    # Imported here because clustering and recommendation import Message from this module
+    from modules.clustering import INSIGHTS
+    from modules.recommendation import (
+        BASE_RECOMMENDATIONS,
+        TARGETED_RECOMMENDATIONS,
+        ENCOURAGEMENT,
+        ALTERNATIVE_ACTIVITIES,
+        VALIDATION_ERRORS,
+        GOALS,
+        REPORT,
+    )
+
+    messages = {}
+    for category, texts in BASE_RECOMMENDATIONS.items():
+        for i, text in enumerate(texts):
+            messages[f"base.{category}.{i}"] = text
+    for feature, levels in TARGETED_RECOMMENDATIONS.items():
+        for level, texts in levels.items():
+            for i, text in enumerate(texts):
+                messages[f"targeted.{feature}.{level}.{i}"] = text
+    for category, texts in ENCOURAGEMENT.items():
+        for i, text in enumerate(texts):
+            messages[f"encouragement.{category}.{i}"] = text
+    for bucket, texts in ALTERNATIVE_ACTIVITIES.items():
+        for i, text in enumerate(texts):
+            messages[f"activity.{bucket}.{i}"] = text
+    for issue, (message, suggestion) in VALIDATION_ERRORS.items():
+        messages[f"error.{issue}.message"] = message
+        messages[f"error.{issue}.suggestion"] = suggestion
+    for key, template in INSIGHTS.items():
+        messages[f"insight.{key}"] = template
+    for key, template in GOALS.items():
+        messages[f"goal.{key}"] = template
+    for key, template in REPORT.items():
+        messages[f"report.{key}"] = template
+    return messages
+
+
+class Catalog:
+    """
+    One locale's messages, built once per process.
+
+    Texts are interned. Ids a translation does not cover point at the base
+    catalog's string objects, so each extra locale only costs its own
+    translated strings. The /messages response body is encoded on first use
+    and reused afterwards.
+    """
+
+    def __init__(self, locale, messages, base=None):
+        self.locale = locale
+        own = {message_id: sys.intern(text) for message_id, text in messages.items()}
+        if base is None:
+            self.messages = own
+            self.ids = {text: message_id for message_id, text in own.items()
+                        if not message_id.startswith(RENDER_ONLY_PREFIXES)}
+            self.translations = {}
+            self.missing = []
+        else:
+            self.messages = {message_id: own.get(message_id, text) for message_id, text in base.messages.items()}
+            self.ids = base.ids
+            # Constant strings in results are the base texts; map them straight to ours
+            self.translations = {text: self.messages[message_id] for message_id, text in base.messages.items()
+                                 if message_id in own and not message_id.startswith(RENDER_ONLY_PREFIXES)}
+            self.missing = [message_id for message_id in base.messages if message_id not in own]
+        # Changes whenever any text or id changes; clients key their cached catalog on it
+        self.version = hashlib.sha1(json.dumps(self.messages, sort_keys=True).encode()).hexdigest()[:12]
+        self._body = None
+
+    def render(self, message):
+        template = self.messages[message.id]
+        return template.format(*message.params) if message.params else template
+
+    def localize(self, value):
+        """Render every Message and translate every catalog string inside a result."""
+        if isinstance(value, Message):
+            return self.render(value)
+        if isinstance(value, str):
+            return self.translations.get(value, value)
+        if isinstance(value, dict):
+            return {key: self.localize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.localize(item) for item in value]
+        return value
+
+    def body(self):
+        """Pre-encoded JSON body for GET /messages."""
+        if self._body is None:
+            self._body = json.dumps({"error": False, "version": self.version, "locale": self.locale,
+                                     "messages": self.messages}).encode("utf-8")
+        return self._body
+
+
+_catalogs = {}
+_locales = None
+_lock = threading.RLock()
+
+
+def available_locales():
+    """Locales with a catalog: the base one plus every locales/<locale>.json."""
+    global _locales
+    if _locales is None:
+        names = os.listdir(LOCALES_DIR) if os.path.isdir(LOCALES_DIR) else []
+        _locales = [DEFAULT_LOCALE] + sorted(name[:-5] for name in names if name.endswith(".json"))
+    return _locales
+
+
+def get_catalog(locale=DEFAULT_LOCALE):
+    """
+    Catalog for a locale ("es", "es-MX", ...), loaded on first use.
+
+    Unknown locales fall back to their language, then to DEFAULT_LOCALE.
+    """
+    locale = (locale or DEFAULT_LOCALE).lower().replace("_", "-")
+    if locale not in available_locales():
+        locale = locale.split("-")[0]
+        if locale not in available_locales():
+            locale = DEFAULT_LOCALE
+
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        with _lock:
+            catalog = _catalogs.get(locale)
+            if catalog is None:
+                if locale == DEFAULT_LOCALE:
+                    catalog = Catalog(locale, _build_base_catalog())
+                else:
+                    with open(os.path.join(LOCALES_DIR, f"{locale}.json"), encoding="utf-8") as f:
+                        catalog = Catalog(locale, json.load(f), base=get_catalog(DEFAULT_LOCALE))
+                    if catalog.missing:
+                        # Untranslated ids render in DEFAULT_LOCALE, mixing languages in one response
+                        print(f"Locale {locale!r} is missing {len(catalog.missing)} of "
+                              f"{len(catalog.messages)} messages: {catalog.missing[:5]}")
+                _catalogs[locale] = catalog
+    return catalog
+
+
+def __getattr__(name):
+    # Base catalog values are built lazily, once clustering and recommendation are importable
+    if name == "MESSAGES":
+        return get_catalog().messages
+    if name == "MESSAGE_IDS":
+        return get_catalog().ids
+    if name == "CATALOG_VERSION":
+        return get_catalog().version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def to_message_ids(value):
+    """
+    Replace every catalog string inside a result with {"id": message_id}, and
+    every Message with {"id": message_id, "params": [...]}.
+
+    Strings that are not in the catalog are left as text.
+    """
+    if isinstance(value, Message):
+        if not value.params:
+            return {"id": value.id}
+        return {"id": value.id, "params": [_plain(param) for param in value.params]}
+    if isinstance(value, str):
+        message_id = get_catalog().ids.get(value)
+        return {"id": message_id} if message_id else value
+    if isinstance(value, dict):
+        return {key: to_message_ids(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_message_ids(item) for item in value]
+    return value
+
+
+def from_message_ids(value, messages=None):
+    """Inverse of to_message_ids, for clients holding a copy of the catalog."""
+    messages = get_catalog().messages if messages is None else messages
+    if isinstance(value, dict):
+        if set(value) == {"id"}:
+            return messages[value["id"]]
+        if set(value) == {"id", "params"}:
+            return messages[value["id"]].format(*value["params"])
+        return {key: from_message_ids(item, messages) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_message_ids(item, messages) for item in value]
+    return value
+
+
+if __name__ == "__main__":
+    # Use the imported module, whose Message class is the one recommend() returns
+    from modules.messages import get_catalog, available_locales, to_message_ids, from_message_ids
+    from modules.recommendation import recommend
+
+    base = get_catalog()
+    rec = recommend([400, 35, 60, 50])
+    text = base.localize(rec)
+    compact = to_message_ids(rec)
+    print(f"Catalog {base.version}: {len(base.messages)} messages, locales {available_locales()}")
+    print(f"Full: {len(json.dumps(text))} bytes, with ids: {len(json.dumps(compact))} bytes")
+    assert from_message_ids(compact) == text
+
+    for locale in available_locales()[1:]:
+        catalog = get_catalog(locale)
+        shared = sum(catalog.messages[i] is base.messages[i] for i in base.messages)
+        print(f"{locale}: {len(base.messages) - shared} translated, {shared} shared with {DEFAULT_LOCALE}")
+        for insight in catalog.localize(rec["insights"]):
+            print(f"  - {insight}")
@@ -0,0 +1,373 @@
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from modules.clustering import FEATURES
+
+# Index lives next to the other trained artifacts
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "trained_models")
+INDEX_DIR = os.path.join(MODEL_DIR, "neighbor_index")
+SCALER_PATH = os.path.join(MODEL_DIR, "kmeans_usage_scaler.pkl")
+
+LEAF_SIZE = 32          # points scanned with one vectorized distance call
+MAX_PENDING = 4096      # inserts kept in a flat buffer before the tree is rebuilt
+QUERY_BLOCK = 1024      # queries prune whole subtrees of at most this many points at once
+
+# Arrays written to disk; each one is a plain .npy file so it can be memory-mapped
+_ARRAYS = ("points", "ids", "node_start", "node_end", "node_left", "node_right",
+           "node_lower", "node_upper", "mean", "scale")
+
+
+def _build_nodes(points, leaf_size):
+    """
+    Build a KD-tree over `points` using flat node arrays.
+
+    Each node covers a contiguous slice of the reordered points and keeps its
+    bounding box, so queries can prune on the exact box distance.
+
+    Returns
+    -------
+    tuple: (order, nodes) where order is the point permutation and nodes is a
+    dict of node arrays
+    """
+    n = len(points)
+    order = np.arange(n)
+    start, end, left, right, lower, upper = [], [], [], [], [], []
+
+    if n == 0:
+        return order, {
+            "node_start": np.zeros(0, dtype=np.int64),
+            "node_end": np.zeros(0, dtype=np.int64),
+            "node_left": np.zeros(0, dtype=np.int64),
+            "node_right": np.zeros(0, dtype=np.int64),
+            "node_lower": np.zeros((0, points.shape[1]), dtype=points.dtype),
+            "node_upper": np.zeros((0, points.shape[1]), dtype=points.dtype),
+        }
+
+    # (node_id, lo, hi) - children are filled in once they get an id
+    stack = [(0, 0, n)]
+    start.append(0); end.append(n); left.append(-1); right.append(-1)
+    lower.append(None); upper.append(None)
+
+    while stack:
+        node, lo, hi = stack.pop()
+        block = points[order[lo:hi]]
+        lower[node] = block.min(axis=0)
+        upper[node] = block.max(axis=0)
+
+        if hi - lo <= leaf_size:
+            continue
+
+        # Split on the widest dimension at the median
+        dim = int(np.argmax(upper[node] - lower[node]))
+        mid = (lo + hi) // 2
+        part = np.argpartition(block[:, dim], mid - lo)
+        order[lo:hi] = order[lo:hi][part]
+
+        for child_lo, child_hi, side in ((lo, mid, left), (mid, hi, right)):
+            child = len(start)
+            start.append(child_lo); end.append(child_hi); left.append(-1); right.append(-1)
+            lower.append(None); upper.append(None)
+            side[node] = child
+            stack.append((child, child_lo, child_hi))
+
+    return order, {
+        "node_start": np.asarray(start, dtype=np.int64),
+        "node_end": np.asarray(end, dtype=np.int64),
+        "node_left": np.asarray(left, dtype=np.int64),
+        "node_right": np.asarray(right, dtype=np.int64),
+        "node_lower": np.vstack(lower).astype(points.dtype),
+        "node_upper": np.vstack(upper).astype(points.dtype),
+    }
+
+
+def _default_scaling():
+    """Mean/scale of the StandardScaler fitted in the clustering notebook."""
+    scaler = joblib.load(SCALER_PATH)
+    return scaler.mean_, scaler.scale_
+
+
+class UsageNeighborIndex:
+    """
+    KD-tree over standardized usage vectors for "users like you" lookups.
+
+    The tree is built in bulk and stored as flat arrays, so a saved index can
+    be opened with memory-mapping and queried without loading it into RAM.
+    New vectors go into a small pending buffer that is scanned directly and
+    merged into the tree once it grows past `max_pending`.
+    """
+
+    def __init__(self, arrays, leaf_size=LEAF_SIZE, max_pending=MAX_PENDING):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.leaf_size = leaf_size
+        self.max_pending = max_pending
+        self._pending_points = []
+        self._pending_ids = []
+        self._pending_cache = None
+        self._blocks = None
+
+    @classmethod
+    def build(cls, usage, ids, mean=None, scale=None, leaf_size=LEAF_SIZE,
+              max_pending=MAX_PENDING):
+        """
+        Build an index from raw usage vectors.
+
+        Parameters
+        ----------
+        usage : array-like, shape (n, 4)
+            Rows of [daily_screen_time, session_duration, app_switches, night_activity]
+        ids : array-like, shape (n,)
+            Integer id stored with each row (user or history record id)
+        mean, scale : array-like, optional
+            Standardization parameters; defaults to the clustering scaler
+        """
+        usage = np.asarray(usage, dtype=np.float64).reshape(-1, len(FEATURES))
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(usage):
+            raise ValueError(f"Got {len(usage)} usage rows but {len(ids)} ids")
+
+        if mean is None or scale is None:
+            mean, scale = _default_scaling()
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+
+        points = ((usage - mean) / scale).astype(np.float32)
+        order, nodes = _build_nodes(points, leaf_size)
+
+        arrays = {"points": points[order], "ids": ids[order], "mean": mean, "scale": scale}
+        arrays.update(nodes)
+        return cls(arrays, leaf_size=leaf_size, max_pending=max_pending)
+
+    @classmethod
+    def load(cls, path=INDEX_DIR, mmap=True):
+        """Open a saved index; arrays are memory-mapped read-only by default."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("features") != FEATURES:
+            raise ValueError(f"Index at {path} was built for features {meta.get('features')}")
+
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                  for name in _ARRAYS}
+        return cls(arrays, leaf_size=meta["leaf_size"])
+
+    def save(self, path=INDEX_DIR):
+        """Write the index (pending inserts included) as .npy files plus meta.json."""
+        if self._pending_ids:
+            self.rebuild()
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            # Write then rename, so readers that memory-mapped the old file keep a valid view
+            target = os.path.join(path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(getattr(self, name)))
+            os.replace(target + ".tmp", target)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"features": FEATURES, "leaf_size": self.leaf_size,
+                       "count": int(len(self.ids))}, f, indent=2)
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending_ids)
+
+    def scale_rows(self, usage):
+        usage = np.asarray(usage, dtype=np.float64).reshape(-1, len(FEATURES))
+        return ((usage - self.mean) / self.scale).astype(np.float32)
+
+    def unscale_rows(self, points):
+        return np.asarray(points, dtype=np.float64) * self.scale + self.mean
+
+    def insert(self, usage, ids):
+        """
+        Add one or more usage vectors.
+
+        Inserts are O(1) until the pending buffer is full, after which the tree
+        is rebuilt in memory with all points.
+        """
+        points = self.scale_rows(usage)
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if len(ids) != len(points):
+            raise ValueError(f"Got {len(points)} usage rows but {len(ids)} ids")
+
+        self._pending_points.extend(points)
+        self._pending_ids.extend(ids.tolist())
+        self._pending_cache = None
+
+        if len(self._pending_ids) >= self.max_pending:
+            self.rebuild()
+
+    def rebuild(self):
+        """Merge pending inserts into the tree."""
+        if not self._pending_ids:
+            return
+        points = np.vstack([np.asarray(self.points), np.asarray(self._pending_points, dtype=np.float32)])
+        ids = np.concatenate([np.asarray(self.ids), np.asarray(self._pending_ids, dtype=np.int64)])
+
+        order, nodes = _build_nodes(points, self.leaf_size)
+        self.points = points[order]
+        self.ids = ids[order]
+        for name, values in nodes.items():
+            setattr(self, name, values)
+
+        self._pending_points = []
+        self._pending_ids = []
+        self._pending_cache = None
+        self._blocks = None
+
+    def _pending_arrays(self):
+        if self._pending_cache is None:
+            self._pending_cache = (np.asarray(self._pending_points, dtype=np.float32),
+                                   np.asarray(self._pending_ids, dtype=np.int64))
+        return self._pending_cache
+
+    def _query_blocks(self):
+        """
+        The highest subtrees holding at most QUERY_BLOCK points: their point
+        ranges and bounding boxes, as arrays covering the whole tree.
+        """
+        if self._blocks is None:
+            nodes = np.zeros(1 if len(self.node_start) else 0, dtype=np.int64)
+            blocks = []
+            while len(nodes):
+                split = ((self.node_end[nodes] - self.node_start[nodes] > QUERY_BLOCK)
+                         & (self.node_left[nodes] >= 0))
+                blocks.append(nodes[~split])
+                nodes = np.concatenate([self.node_left[nodes[split]], self.node_right[nodes[split]]])
+            blocks = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int64)
+            self._blocks = (np.asarray(self.node_start[blocks]), np.asarray(self.node_end[blocks]),
+                            np.asarray(self.node_lower[blocks]), np.asarray(self.node_upper[blocks]))
+        return self._blocks
+
+    def query(self, usage, k=5):
+        """
+        Find the k nearest stored vectors to a single usage vector.
+
+        The box distance to every block (see _query_blocks) is computed in one
+        vectorized call; blocks are then scanned nearest first until the next
+        box is farther than the current k-th neighbor.
+
+        Returns
+        -------
+        tuple: (ids, distances, usage_rows), closest first. Distances are
+        Euclidean in standardized feature space.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        q = self.scale_rows(usage)[0]
+        # Best k so far; position < 0 marks pending rows
+        best_d = np.zeros(0, dtype=np.float32)
+        best_pos = np.zeros(0, dtype=np.int64)
+
+        def offer(dists, positions):
+            nonlocal best_d, best_pos
+            dists = np.concatenate([best_d, dists])
+            positions = np.concatenate([best_pos, positions])
+            if len(dists) > k:
+                keep = np.argpartition(dists, k - 1)[:k]
+                dists, positions = dists[keep], positions[keep]
+            best_d, best_pos = dists, positions
+            return float(dists.max()) if len(dists) == k else np.inf
+
+        kth = np.inf
+        if self._pending_ids:
+            pending_points, _ = self._pending_arrays()
+            diff = pending_points - q
+            kth = offer(np.einsum("ij,ij->i", diff, diff), -1 - np.arange(len(pending_points)))
+
+        starts, ends, lower, upper = self._query_blocks()
+        if len(starts):
+            gap = np.maximum(lower - q, 0) + np.maximum(q - upper, 0)
+            bounds = np.einsum("ij,ij->i", gap, gap)
+            nearest = int(np.argmin(bounds))
+            candidates = np.flatnonzero(bounds < kth)
+            candidates = candidates[np.argsort(bounds[candidates], kind="stable")]
+            for block in [nearest, *candidates[candidates != nearest].tolist()]:
+                if bounds[block] >= kth:
+                    break
+                lo, hi = starts[block], ends[block]
+                diff = self.points[lo:hi] - q
+                kth = offer(np.einsum("ij,ij->i", diff, diff), np.arange(lo, hi))
+
+        order = np.argsort(best_d, kind="stable")
+        pending_points, pending_ids = self._pending_arrays() if self._pending_ids else (None, None)
+
+        ids, distances, rows = [], [], []
+        for d, pos in zip(best_d[order].tolist(), best_pos[order].tolist()):
+            if pos >= 0:
+                ids.append(int(self.ids[pos]))
+                rows.append(self.points[pos])
+            else:
+                ids.append(int(pending_ids[-1 - pos]))
+                rows.append(pending_points[-1 - pos])
+            distances.append(float(np.sqrt(d)))
+
+        usage_rows = self.unscale_rows(rows) if rows else np.zeros((0, len(FEATURES)))
+        return ids, distances, usage_rows
+
+
+def build_index_from_csv(csv_path, out_dir=INDEX_DIR, id_column="user_id"):
+    """Bulk-build an index from a dataset CSV with FEATURES columns and save it."""
+    df = pd.read_csv(csv_path)
+    ids = df[id_column].values if id_column in df else np.arange(len(df))
+    index = UsageNeighborIndex.build(df[FEATURES].values, ids)
+    index.save(out_dir)
+    return index
+
+
+_index = None
+
+
+def get_index():
+    """Lazily open the shipped index (memory-mapped) once per process."""
+    global _index
+    if _index is None:
+        _index = UsageNeighborIndex.load(os.environ.get("NEIGHBOR_INDEX_DIR", INDEX_DIR))
+    return _index
+
+
+def find_similar_users(user_data, k=5):
+    """
+    Find users whose usage pattern is closest to `user_data`.
+
+    Parameters
+    ----------
+    user_data : list or array
+        [daily_screen_time, session_duration, app_switches, night_activity]
+    k : int
+        Number of neighbors to return
+
+    Returns
+    -------
+    dict with:
+        neighbors (list) : [{id, usage, distance}, ...], closest first
+    """
+    if len(user_data) != len(FEATURES):
+        raise ValueError(f"Expected {len(FEATURES)} features: {FEATURES}, got {len(user_data)}")
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+
+    ids, distances, rows = get_index().query(user_data, k=k)
+    return {
+        "neighbors": [
+            {
+                "id": user_id,
+                "usage": [round(float(v), 2) for v in row],
+                "distance": round(distance, 4)
+            }
+            for user_id, distance, row in zip(ids, distances, rows)
+        ]
+    }
+
+
+if __name__ == "__main__":
+    dataset = os.path.join(os.path.dirname(__file__), "..", "preprocessing", "expanded_dataset.csv")
+    index = build_index_from_csv(dataset)
+    print(f"Built neighbor index with {len(index)} users at {INDEX_DIR}")
+
+    for user in ([120, 10, 15, 5], [400, 35, 60, 50]):
+        print(f"\n--- Similar users for {user} ---")
+        for neighbor in find_similar_users(user, k=3)["neighbors"]:
+            print(f"  user {neighbor['id']}: {neighbor['usage']} (distance {neighbor['distance']})")
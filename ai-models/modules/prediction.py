@@ -1,20 +1,108 @@
 import joblib
+import json
 import os
 import pandas as pd
 import numpy as np
 
+from modules.distillation import CompactTree, COMPACT_MODEL_PATH
+from modules.explanation import ForestExplainer
+from modules.validation import (
+    FEATURES, validate, check_rows,
+    ZERO_USAGE, LOW_USAGE, NEGATIVE_VALUES, NOT_FINITE,
+    UNREALISTIC_SCREEN_TIME, INVALID_NIGHT_ACTIVITY,
+)
+
 # Path to trained model
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "trained_models")
 MODEL_PATH = os.path.join(MODEL_DIR, "rf_addiction_pipeline.pkl")
 
-model = joblib.load(MODEL_PATH)
+# Published checkpoints (see modules/incremental_training.py) are listed here
+MANIFEST_PATH = os.path.join(MODEL_DIR, "model_versions.json")
+BASELINE_VERSION = "baseline"
+
+
+def resolve_model_version(version=None):
+    """
+    Find the pickle for a model version.
+
+    With no version, the manifest's "current" entry is used if one has been
+    published, otherwise the notebook-trained baseline pipeline.
+
+    Returns
+    -------
+    tuple: (version, path)
+    """
+    manifest = {}
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+
+    version = version or manifest.get("current") or BASELINE_VERSION
+    if version == BASELINE_VERSION:
+        return version, MODEL_PATH
+    if version not in manifest.get("versions", {}):
+        raise ValueError(f"Unknown model version: {version}")
+    return version, os.path.join(MODEL_DIR, manifest["versions"][version]["path"])
+
+
+def load_model(version=None):
+    """Load (or hot-swap to) a model version for predict_addiction."""
+    global model, MODEL_VERSION, _explainer, _compact_model
+    MODEL_VERSION, path = resolve_model_version(version)
+    model = joblib.load(path)
+    _explainer = None
+    _compact_model = None
+    return model
+
+
+def get_explainer():
+    """Path-contribution explainer for the loaded model, built once per version."""
+    global _explainer
+    if _explainer is None:
+        _explainer = ForestExplainer(model)
+    return _explainer
+
+
+def get_compact_model():
+    """
+    Distilled low-latency model (see modules/distillation.py), loaded on first use.
+
+    Returns None when no compact model was distilled from the loaded model
+    version, so callers fall back to the forest instead of serving a
+    distillation of a different model.
+    """
+    global _compact_model
+    if _compact_model is None:
+        compact = CompactTree.load(COMPACT_MODEL_PATH) if os.path.exists(COMPACT_MODEL_PATH) else None
+        if compact is not None and compact.meta.get("teacher_version") != MODEL_VERSION:
+            print(f"Compact model was distilled from {compact.meta.get('teacher_version')}, "
+                  f"not {MODEL_VERSION}; using the forest")
+            compact = None
+        _compact_model = compact or False   # False: checked, nothing usable for this version
+    return _compact_model or None
+
 
-FEATURES = ["daily_screen_time", "session_duration", "app_switches", "night_activity"]
+model = None
+MODEL_VERSION = None
+_explainer = None
+_compact_model = None
+load_model(os.environ.get("ADDICTION_MODEL_VERSION"))
 
-def predict_addiction(user_data):
+def predict_addiction(user_data, explain=False, compact=False):
     """
     Predicts addiction risk for a new user.
     
+    Parameters
+    ----------
+    user_data : list or array
+        [daily_screen_time, session_duration, app_switches, night_activity]
+    explain : bool
+        Also return per-feature contributions to the addiction probability
+    compact : bool
+        Score with the distilled compact tree instead of the forest
+        (ignored when explain is set, or when the compact tree was not
+        distilled from the loaded model version)
+    
     Returns
     -------
     dict with:
@@ -22,15 +110,24 @@ def predict_addiction(user_data):
         probability (float): probability of addiction
         probabilities (dict): class-wise probabilities
         note (str, optional): warning for edge cases
+        tier (str, compact only): "compact" when the distilled model was used
+        base_probability (float, explain only): forest's average probability
+        breakdown (dict, explain only): contribution of each feature, summing
+            with base_probability to the probability
     """
-    if len(user_data) != len(FEATURES):
-        raise ValueError(f"Expected {len(FEATURES)} features: {FEATURES}, got {len(user_data)}")
+    user_data = validate(user_data)
+
+    # Invalid values are rejected before any shortcut, as in recommend()
+    if user_data.has(NEGATIVE_VALUES):
+        raise ValueError("Negative values not allowed in user data")
+    if user_data.has(NOT_FINITE):
+        raise ValueError("Usage values must be finite numbers")
 
     # Edge case handling
     result = {}
     
     # Check for zero usage
-    if all(val == 0 for val in user_data):
+    if user_data.has(ZERO_USAGE):
         result["note"] = "No usage detected - prediction may not be meaningful"
         result["prediction"] = 0
         result["probability"] = 0.0
@@ -38,30 +135,40 @@ def predict_addiction(user_data):
         return result
     
     # Check for very low usage (likely healthy)
-    if user_data[0] < 30:  # Less than 30 minutes daily
+    if user_data.has(LOW_USAGE):  # Less than 30 minutes daily
         result["note"] = "Very low usage detected - likely healthy"
         result["prediction"] = 0
         result["probability"] = 0.0
         result["probabilities"] = {"healthy": 1.0, "addicted": 0.0}
         return result
     
-    # Check for negative values
-    if any(val < 0 for val in user_data):
-        raise ValueError("Negative values not allowed in user data")
-    
     # Check for unrealistic values
-    if user_data[0] > 1440:  # More than 24 hours
+    if user_data.has(UNREALISTIC_SCREEN_TIME):  # More than 24 hours
         result["note"] = "Unrealistic screen time detected (>24 hours)"
     
-    if user_data[3] > user_data[0]:  # Night activity exceeds total screen time
+    if user_data.has(INVALID_NIGHT_ACTIVITY):  # Night activity exceeds total screen time
         result["note"] = "Invalid data: night activity exceeds total screen time"
     
     # Normal prediction
-    user_df = pd.DataFrame([user_data], columns=FEATURES)
-    
     try:
-        prediction = int(model.predict(user_df)[0])
-        probs = model.predict_proba(user_df)[0]
+        compact_model = get_compact_model() if compact and not explain else None
+        if compact_model is not None:
+            addicted = compact_model.predict_one(user_data)
+            probs = [1 - addicted, addicted]
+            prediction = int(probs[1] > probs[0])
+            result["tier"] = "compact"
+        elif explain:
+            # The explainer reproduces predict_proba, so the model is walked only once
+            explainer = get_explainer()
+            addicted, contributions = explainer.explain([user_data])
+            probs = [1 - addicted[0], addicted[0]]
+            prediction = int(probs[1] > probs[0])
+            result["base_probability"] = round(explainer.bias, 3)
+            result["breakdown"] = explainer.breakdown(contributions[0])
+        else:
+            user_df = pd.DataFrame([user_data], columns=FEATURES)
+            prediction = int(model.predict(user_df)[0])
+            probs = model.predict_proba(user_df)[0]
         
         result.update({
             "prediction": prediction,
@@ -82,6 +189,25 @@ def predict_addiction(user_data):
     
     return result
 
+def predict_addiction_batch(rows):
+    """
+    Vectorized predict_addiction for many users at once.
+    
+    Rows hitting the zero / very-low-usage shortcuts get probability 0.0,
+    like predict_addiction. Rows should already be validated.
+    
+    Returns
+    -------
+    tuple: (predictions, probabilities) arrays of shape (n,)
+    """
+    rows = np.asarray(rows, dtype=float).reshape(-1, len(FEATURES))
+    probabilities = np.zeros(len(rows))
+    scored = (check_rows(rows) & (ZERO_USAGE | LOW_USAGE)) == 0
+    if scored.any():
+        probabilities[scored] = model.predict_proba(pd.DataFrame(rows[scored], columns=FEATURES))[:, 1]
+    return (probabilities > 0.5).astype(int), probabilities
+
+
 if __name__ == "__main__":
     # Test various cases
     test_cases = [
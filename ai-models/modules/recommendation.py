@@ -1,5 +1,7 @@
-from modules.clustering import predict_cluster, get_personalized_insights, FEATURES
-from modules.prediction import predict_addiction
+from modules.clustering import predict_cluster, predict_cluster_batch, get_personalized_insights, FEATURES, LABELS
+from modules.prediction import predict_addiction, predict_addiction_batch
+from modules.validation import validate, validate_batch, ISSUE_NAMES
+from modules.messages import Message, get_catalog, DEFAULT_LOCALE
 import numpy as np
 
 # Base recommendations by usage level
@@ -106,6 +108,111 @@ ENCOURAGEMENT = {
 }
 
 
+# Healthy alternatives by minutes of reclaimable time
+ALTERNATIVE_ACTIVITIES = {
+    "5-15": [
+        "Practice deep breathing exercises",
+        "Do a quick stretching routine",
+        "Drink water and take a mindful walk around your space",
+        "Listen to a favorite song and dance"
+    ],
+    "15-30": [
+        "Go for a short walk outside",
+        "Read a chapter of a book",
+        "Practice a musical instrument",
+        "Call a friend or family member",
+        "Try a guided meditation"
+    ],
+    "30-60": [
+        "Exercise or go for a run",
+        "Cook a healthy meal",
+        "Work on a creative project",
+        "Learn something new with an online course",
+        "Play a board game with family"
+    ],
+    "60+": [
+        "Visit a museum or library",
+        "Join a sports activity or class",
+        "Volunteer in your community",
+        "Start a new hobby (painting, gardening, etc.)",
+        "Spend quality time with loved ones"
+    ]
+}
+
+
+# Goal templates (catalog ids "goal.<key>"); parameters are minutes
+GOALS = {
+    "minimal.maintain_minimal": "Continue maintaining minimal screen time usage",
+    "minimal.stay_mindful": "Stay mindful of potential future increases in usage",
+    "minimal.encourage_others": "Encourage healthy habits in others",
+    "minimal.maintain_habits": "Maintain your excellent digital wellness habits",
+    "minimal.help_others": "Help others develop healthier relationships with technology",
+    "minimal.prioritize_real_world": "Continue prioritizing real-world activities",
+    "trending_up": "Your usage is trending up (about {0} min/day next week) - hold it at {1} minutes first",
+    "reduce_screen_time": "Reduce daily screen time to {0} minutes (currently {1} min)",
+    "limit_night": "Limit nighttime usage to {0} minutes (currently {1} min)",
+    "three_day_streak": "Complete 3 days without exceeding your screen time goal",
+    "maintain_target": "Maintain screen time under {0} minutes for 2 weeks",
+    "digital_sunset": "Build a consistent 'digital sunset' routine 1 hour before bed",
+    "replace_hour": "Replace one hour of daily screen time with a hobby or exercise",
+}
+
+
+# Summary report labels (catalog ids "report.<key>"). Only rendered through
+# Message, so e.g. "Addicted" here never translates the API's addiction_status.
+REPORT = {
+    "title": "DIGITAL WELLNESS ASSESSMENT REPORT",
+    "warning": "WARNING: {0}",
+    "tip": "TIP: {0}",
+    "classification": "USAGE CLASSIFICATION: {0}",
+    "score": "Overall Score: {0}/500",
+    "status": "Status: {0} (Risk: {1}%)",
+    "insights": "PERSONALIZED INSIGHTS:",
+    "goals": "YOUR GOALS:",
+    "short_term": "Short-term:",
+    "recommendations": "TOP RECOMMENDATIONS:",
+    "targeted_tips": "TARGETED TIPS:",
+    "activities": "ALTERNATIVE ACTIVITIES ({0} min available):",
+    "encouragement": "ENCOURAGEMENT:",
+    "cluster.light": "LIGHT",
+    "cluster.moderate": "MODERATE",
+    "cluster.heavy": "HEAVY",
+    "status.Addicted": "Addicted",
+    "status.Healthy": "Healthy",
+}
+
+
+# User-facing messages for each is_valid_user_data issue
+VALIDATION_ERRORS = {
+    "zero_usage": (
+        "No usage data detected. Please use the app to collect usage statistics.",
+        "Start tracking your social media usage for personalized recommendations."
+    ),
+    "negative_values": (
+        "Invalid data: negative values detected.",
+        "Please ensure all usage values are non-negative."
+    ),
+    "unrealistic_screen_time": (
+        "Invalid data: screen time exceeds 24 hours.",
+        "Please check your input data for errors."
+    ),
+    "invalid_night_activity": (
+        "Invalid data: night activity cannot exceed total screen time.",
+        "Please verify your usage data."
+    ),
+    "not_finite": (
+        "Invalid data: usage values must be finite numbers.",
+        "Please check your input data for errors."
+    )
+}
+
+
+def validation_error(issue):
+    """Error result returned by recommend() for an invalid input."""
+    message, suggestion = VALIDATION_ERRORS[issue]
+    return {"error": True, "message": message, "suggestion": suggestion}
+
+
 def is_valid_user_data(user_data):
     """
     Check if user data is valid and meaningful.
@@ -114,23 +221,10 @@ def is_valid_user_data(user_data):
     -------
     tuple: (is_valid, issue_description)
     """
-    # Check for all zeros
-    if all(val == 0 for val in user_data):
-        return False, "zero_usage"
-    
-    # Check for negative values
-    if any(val < 0 for val in user_data):
-        return False, "negative_values"
-    
-    # Check for unrealistic values (screen time > 24 hours, etc.)
-    if user_data[0] > 1440:  # More than 24 hours
-        return False, "unrealistic_screen_time"
-    
-    # Check if night activity exceeds total screen time
-    if user_data[3] > user_data[0]:
-        return False, "invalid_night_activity"
-    
-    return True, None
+    # Zero usage, negative values, screen time > 24 hours and night activity
+    # exceeding screen time are all checked once by modules.validation
+    issue = validate(user_data).issue
+    return issue is None, issue
 
 
 def get_targeted_suggestions(user_data, cluster_label):
@@ -175,13 +269,19 @@ def get_targeted_suggestions(user_data, cluster_label):
     return suggestions
 
 
-def get_progressive_goals(user_data, cluster_label):
+def get_progressive_goals(user_data, cluster_label, forecast=None):
     """
     Generate achievable, progressive goals based on current usage.
     
+    Parameters
+    ----------
+    forecast : dict, optional
+        forecasting.forecast_user() result; targets then follow the user's
+        trajectory instead of only today's screen time
+    
     Returns
     -------
-    dict : Short-term and long-term goals
+    dict : Short-term and long-term goals as messages.Message lists
     """
     screen_time = user_data[0]
     night_activity = user_data[3]
@@ -190,14 +290,14 @@ def get_progressive_goals(user_data, cluster_label):
     if screen_time < 30:
         return {
             "short_term": [
-                "Continue maintaining minimal screen time usage",
-                "Stay mindful of potential future increases in usage",
-                "Encourage healthy habits in others"
+                Message("goal.minimal.maintain_minimal"),
+                Message("goal.minimal.stay_mindful"),
+                Message("goal.minimal.encourage_others")
             ],
             "long_term": [
-                "Maintain your excellent digital wellness habits",
-                "Help others develop healthier relationships with technology",
-                "Continue prioritizing real-world activities"
+                Message("goal.minimal.maintain_habits"),
+                Message("goal.minimal.help_others"),
+                Message("goal.minimal.prioritize_real_world")
             ]
         }
     
@@ -209,19 +309,28 @@ def get_progressive_goals(user_data, cluster_label):
     else:
         reduction_pct = 0.05
     
-    target_screen_time = max(60, int(screen_time * (1 - reduction_pct)))  # Minimum 60 min goal
+    # Cut from where usage is heading if it is already falling, never from a rising forecast
+    baseline = screen_time
+    if forecast:
+        baseline = min(screen_time, forecast["next_week"])
+    
+    target_screen_time = max(60, int(baseline * (1 - reduction_pct)))  # Minimum 60 min goal
     target_night_activity = max(15, int(night_activity * 0.5))  # Aim for 50% reduction or 15 min max
     
+    short_term = [
+        Message("goal.reduce_screen_time", target_screen_time, int(screen_time)),
+        Message("goal.limit_night", target_night_activity, int(night_activity)),
+        Message("goal.three_day_streak")
+    ]
+    if forecast and forecast["next_week"] > screen_time:
+        short_term.insert(0, Message("goal.trending_up", int(forecast["next_week"]), int(screen_time)))
+    
     return {
-        "short_term": [
-            f"Reduce daily screen time to {target_screen_time} minutes (currently {int(screen_time)} min)",
-            f"Limit nighttime usage to {target_night_activity} minutes (currently {int(night_activity)} min)",
-            "Complete 3 days without exceeding your screen time goal"
-        ],
+        "short_term": short_term,
         "long_term": [
-            f"Maintain screen time under {int(target_screen_time * 0.9)} minutes for 2 weeks",
-            "Build a consistent 'digital sunset' routine 1 hour before bed",
-            "Replace one hour of daily screen time with a hobby or exercise"
+            Message("goal.maintain_target", int(target_screen_time * 0.9)),
+            Message("goal.digital_sunset"),
+            Message("goal.replace_hour")
         ]
     }
 
@@ -241,47 +350,17 @@ def get_alternative_activities(cluster_label, time_available):
     -------
     list : Activity suggestions tailored to available time
     """
-    activities = {
-        "5-15": [
-            "Practice deep breathing exercises",
-            "Do a quick stretching routine",
-            "Drink water and take a mindful walk around your space",
-            "Listen to a favorite song and dance"
-        ],
-        "15-30": [
-            "Go for a short walk outside",
-            "Read a chapter of a book",
-            "Practice a musical instrument",
-            "Call a friend or family member",
-            "Try a guided meditation"
-        ],
-        "30-60": [
-            "Exercise or go for a run",
-            "Cook a healthy meal",
-            "Work on a creative project",
-            "Learn something new with an online course",
-            "Play a board game with family"
-        ],
-        "60+": [
-            "Visit a museum or library",
-            "Join a sports activity or class",
-            "Volunteer in your community",
-            "Start a new hobby (painting, gardening, etc.)",
-            "Spend quality time with loved ones"
-        ]
-    }
-    
     if time_available < 15:
-        return activities["5-15"]
+        return ALTERNATIVE_ACTIVITIES["5-15"]
     elif time_available < 30:
-        return activities["15-30"]
+        return ALTERNATIVE_ACTIVITIES["15-30"]
     elif time_available < 60:
-        return activities["30-60"]
+        return ALTERNATIVE_ACTIVITIES["30-60"]
     else:
-        return activities["60+"]
+        return ALTERNATIVE_ACTIVITIES["60+"]
 
 
-def recommend(user_data):
+def recommend(user_data, forecast=None, cluster_result=None, prediction_result=None):
     """
     Generates comprehensive detox recommendations using weighted scoring
     and personalized insights.
@@ -290,43 +369,27 @@ def recommend(user_data):
     ----------
     user_data : list
         [daily_screen_time, session_duration, app_switches, night_activity]
+    forecast : dict, optional
+        forecasting.forecast_user() result for this user's next week
+    cluster_result, prediction_result : dict, optional
+        predict_cluster() / predict_addiction() results for user_data the
+        caller already has (e.g. from the result cache), so neither model
+        runs again
     
     Returns
     -------
     dict with recommendations or error information
     """
-    # Validate input
+    # Validate input (once; downstream calls reuse the result)
+    user_data = validate(user_data)
     is_valid, issue = is_valid_user_data(user_data)
     
     if not is_valid:
-        if issue == "zero_usage":
-            return {
-                "error": True,
-                "message": "No usage data detected. Please use the app to collect usage statistics.",
-                "suggestion": "Start tracking your social media usage for personalized recommendations."
-            }
-        elif issue == "negative_values":
-            return {
-                "error": True,
-                "message": "Invalid data: negative values detected.",
-                "suggestion": "Please ensure all usage values are non-negative."
-            }
-        elif issue == "unrealistic_screen_time":
-            return {
-                "error": True,
-                "message": "Invalid data: screen time exceeds 24 hours.",
-                "suggestion": "Please check your input data for errors."
-            }
-        elif issue == "invalid_night_activity":
-            return {
-                "error": True,
-                "message": "Invalid data: night activity cannot exceed total screen time.",
-                "suggestion": "Please verify your usage data."
-            }
+        return validation_error(issue)
     
     # Get clustering and prediction results
-    cluster_result = get_personalized_insights(user_data)
-    prediction_result = predict_addiction(user_data)
+    cluster_result = get_personalized_insights(user_data, cluster_result)
+    prediction_result = prediction_result or predict_addiction(user_data)
     
     cluster_label = cluster_result["label"]
     addiction_status = "Addicted" if prediction_result["prediction"] == 1 else "Healthy"
@@ -343,11 +406,12 @@ def recommend(user_data):
     targeted_tips = get_targeted_suggestions(user_data, cluster_label)
     
     # Generate progressive goals
-    goals = get_progressive_goals(user_data, cluster_label)
+    goals = get_progressive_goals(user_data, cluster_label, forecast)
     
     # Estimate time that could be reclaimed (for heavy/addicted users)
     if cluster_label in ["heavy", "moderate"] or prediction_result["prediction"] == 1:
-        reclaimable_time = max(15, int(user_data[0] * 0.15))  # 15% reduction target, min 15 min
+        expected_usage = forecast["next_week"] if forecast else user_data[0]
+        reclaimable_time = max(15, int(expected_usage * 0.15))  # 15% reduction target, min 15 min
     else:
         reclaimable_time = 30  # Default for light users
     
@@ -356,7 +420,7 @@ def recommend(user_data):
     # Select encouragement message
     encouragement = np.random.choice(ENCOURAGEMENT[recommendation_category])
     
-    return {
+    result = {
         "error": False,
         "cluster_label": cluster_label,
         "addiction_status": addiction_status,
@@ -371,65 +435,123 @@ def recommend(user_data):
         "insights": cluster_result["insights"],
         "reclaimable_time": reclaimable_time
     }
+    if forecast:
+        result["forecast"] = forecast
+    return result
+
+
+def recommend_batch(rows):
+    """
+    Bulk variant of recommend() for re-scoring many users.
+    
+    Clustering and addiction probabilities are computed for the whole batch
+    at once; the result per row is the compact subset of recommend() needed
+    for stored assessments (no random encouragement, goals or activities).
+    
+    Parameters
+    ----------
+    rows : array-like, shape (n, 4)
+        [daily_screen_time, session_duration, app_switches, night_activity] rows
+    
+    Returns
+    -------
+    list of dicts, one per row, with recommend()'s error format for invalid rows
+    """
+    rows, _, codes = validate_batch(np.asarray(rows, dtype=float).reshape(-1, len(FEATURES)))
+    clusters, scores = predict_cluster_batch(rows)
+    
+    valid = codes == 0
+    predictions = np.zeros(len(rows), dtype=int)
+    probabilities = np.zeros(len(rows))
+    if valid.any():
+        predictions[valid], probabilities[valid] = predict_addiction_batch(rows[valid])
+    
+    results = []
+    for i, row in enumerate(rows):
+        if codes[i]:
+            results.append(validation_error(ISSUE_NAMES[codes[i]]))
+            continue
+        
+        cluster_label = LABELS[clusters[i]]
+        category = "addicted" if predictions[i] == 1 else cluster_label
+        results.append({
+            "error": False,
+            "cluster": int(clusters[i]),
+            "cluster_label": cluster_label,
+            "addiction_status": "Addicted" if predictions[i] == 1 else "Healthy",
+            "probability": round(float(probabilities[i]), 2),
+            "usage_score": round(float(scores[i]), 2),
+            "recommendation_category": category,
+            "suggestions": BASE_RECOMMENDATIONS[category][:3],
+            "targeted_tips": get_targeted_suggestions(row, cluster_label)[:3]
+        })
+    
+    return results
 
 
-def get_summary_report(user_data):
+def get_summary_report(user_data, locale=DEFAULT_LOCALE):
     """
     Generate a comprehensive summary report for display in the app.
     
+    Parameters
+    ----------
+    locale : str, language the messages are rendered in ("es", "es-MX", ...)
+    
     Returns
     -------
     str : Formatted text summary
     """
-    rec = recommend(user_data)
-    
-    # Handle error cases
-    if rec.get("error"):
-        return f"""
+    catalog = get_catalog(locale)
+    rec = catalog.localize(recommend(user_data))
+
+    def text(key, *params):
+        return catalog.render(Message(f"report.{key}", *params))
+
+    header = f"""
 +--------------------------------------------------------------+
-|         DIGITAL WELLNESS ASSESSMENT REPORT                   |
+|         {text('title'):<53}|
 +--------------------------------------------------------------+
+"""
 
-WARNING: {rec['message']}
+    # Handle error cases
+    if rec.get("error"):
+        return header + f"""
+{text('warning', rec['message'])}
 
-TIP: {rec['suggestion']}
+{text('tip', rec['suggestion'])}
 
 --------------------------------------------------------------
 """
     
-    report = f"""
-+--------------------------------------------------------------+
-|         DIGITAL WELLNESS ASSESSMENT REPORT                   |
-+--------------------------------------------------------------+
-
-USAGE CLASSIFICATION: {rec['cluster_label'].upper()}
-   Overall Score: {rec['usage_score']}/500
-   Status: {rec['addiction_status']} (Risk: {rec['probability']*100:.0f}%)
+    report = header + f"""
+{text('classification', text('cluster.' + rec['cluster_label']))}
+   {text('score', rec['usage_score'])}
+   {text('status', text('status.' + rec['addiction_status']), f"{rec['probability']*100:.0f}")}
 
-PERSONALIZED INSIGHTS:
+{text('insights')}
 """
     for insight in rec['insights']:
         report += f"   - {insight}\n"
     
-    report += f"\nYOUR GOALS:\n"
-    report += "   Short-term:\n"
+    report += f"\n{text('goals')}\n"
+    report += f"   {text('short_term')}\n"
     for goal in rec['goals']['short_term']:
         report += f"   - {goal}\n"
     
-    report += f"\nTOP RECOMMENDATIONS:\n"
+    report += f"\n{text('recommendations')}\n"
     for i, suggestion in enumerate(rec['suggestions'], 1):
         report += f"   {i}. {suggestion}\n"
     
     if rec['targeted_tips']:
-        report += f"\nTARGETED TIPS:\n"
+        report += f"\n{text('targeted_tips')}\n"
         for tip in rec['targeted_tips']:
             report += f"   - {tip}\n"
     
-    report += f"\nALTERNATIVE ACTIVITIES ({rec['reclaimable_time']} min available):\n"
+    report += f"\n{text('activities', rec['reclaimable_time'])}\n"
     for activity in rec['alternative_activities']:
         report += f"   - {activity}\n"
     
-    report += f"\nENCOURAGEMENT:\n"
+    report += f"\n{text('encouragement')}\n"
     report += f"   {rec['encouragement']}\n"
     report += "-" * 62 + "\n"
     
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from modules import clustering
+from modules import prediction
+from modules.clustering import FEATURES
+from modules.messages import CATALOG_VERSION
+from modules.recommendation import recommend_batch
+from modules.validation import validate_batch
+
+STATE_DIR = os.environ.get("RESCORING_STATE_DIR",
+                           os.path.join(os.path.dirname(__file__), "..", "rescoring_state"))
+BATCH_SIZE = 1000
+# history_through is set this far before the scan started: append() stamps a
+# record before it takes the store's lock, so a record may land on disk a
+# little after its timestamp. Re-scanned records just match their fingerprints.
+WATERMARK_MARGIN = 300
+
+# One row per user, sorted by user_id. `fingerprint` covers the inputs and
+# the model/rule versions the stored result was computed with.
+COLUMNS = [
+    ("user_id", "S24"),
+    ("fingerprint", "<u8"),
+    ("scored_at", "<f8"),
+    ("issue", "u1"),            # validation status code (0 = valid)
+    ("cluster", "i1"),
+    ("prediction", "i1"),
+    ("probability", "<f4"),
+    ("usage_score", "<f4"),
+]
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+
+
+def rules_version():
+    """Hash of everything besides the model that shapes a result: scoring rules and message text."""
+    rules = {
+        "weights": np.asarray(clustering.WEIGHTS).tolist(),
+        "thresholds": clustering.THRESHOLDS,
+        "catalog": CATALOG_VERSION,
+    }
+    return hashlib.sha1(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def version_hash(model_version=None, rules=None):
+    model_version = prediction.MODEL_VERSION if model_version is None else model_version
+    rules = rules_version() if rules is None else rules
+    digest = hashlib.blake2b(f"{model_version}|{rules}".encode(), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, "little"))
+
+
+def _mix(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps
+    x = (x ^ (x >> np.uint64(30))) * _M1
+    x = (x ^ (x >> np.uint64(27))) * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def fingerprint_rows(usage, seed):
+    """64-bit hash per (n, 4) usage row, seeded with version_hash(), computed column-wise."""
+    # +0.0 folds -0.0 into 0.0 so equal inputs hash equally
+    words = (np.asarray(usage, dtype=np.float64).reshape(-1, len(FEATURES)) + 0.0).view(np.uint64)
+    h = np.full(len(words), seed, dtype=np.uint64)
+    for column in words.T:
+        h = _mix(h ^ column)
+    return h
+
+
+class RescoringState:
+    """
+    Last scored result and fingerprint of every user, kept as sorted columns.
+
+    `run()` fingerprints the incoming inputs, compares them with the stored
+    fingerprints through one searchsorted lookup, and re-scores only users
+    that are new or whose inputs, model version or rules changed.
+    """
+
+    def __init__(self, columns=None, meta=None):
+        if columns is None:
+            columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+        self.columns = columns
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path=STATE_DIR):
+        """Saved state, or an empty one if nothing was saved yet."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return cls()
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return cls({name: np.load(os.path.join(path, f"{name}.npy")) for name, _ in COLUMNS}, meta)
+
+    def save(self, path=STATE_DIR, history_through=None):
+        """
+        Write the columns, then meta.json.
+
+        `history_through` is the history timestamp up to which every analysis
+        has been scored; the next rescore_history() only scans from there.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, _ in COLUMNS:
+            target = os.path.join(path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, self.columns[name])
+            os.replace(target + ".tmp", target)
+        meta = {"count": len(self), "model_version": prediction.MODEL_VERSION,
+                "rules_version": rules_version(), "version_hash": int(version_hash()),
+                "history_through": history_through, "saved_at": time.time()}
+        with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+
+    def __len__(self):
+        return len(self.columns["user_id"])
+
+    def _lookup(self, user_ids):
+        """Positions of user_ids in the state, and whether each was found."""
+        known = self.columns["user_id"]
+        positions = np.searchsorted(known, user_ids)
+        found = positions < len(known)
+        found[found] = known[positions[found]] == user_ids[found]
+        return positions, found
+
+    def dirty(self, user_ids, fingerprints):
+        """Boolean mask of users that are new or whose fingerprint changed."""
+        positions, found = self._lookup(user_ids)
+        dirty = ~found
+        dirty[found] = self.columns["fingerprint"][positions[found]] != fingerprints[found]
+        return dirty
+
+    def _update(self, updates):
+        positions, found = self._lookup(updates["user_id"])
+        for name, _ in COLUMNS:
+            self.columns[name][positions[found]] = updates[name][found]
+
+        new = ~found
+        if new.any():
+            merged = {name: np.concatenate([self.columns[name], updates[name][new]]) for name, _ in COLUMNS}
+            order = np.argsort(merged["user_id"], kind="stable")
+            self.columns = {name: merged[name][order] for name, _ in COLUMNS}
+
+    def run(self, user_ids, usage, batch_size=BATCH_SIZE, now=None):
+        """
+        Re-score the users whose inputs, model or rules changed.
+
+        Parameters
+        ----------
+        user_ids : array-like of str/bytes, unique, at most 24 bytes each
+        usage : array-like, shape (n, 4), each user's current usage vector
+
+        Returns
+        -------
+        dict : users, dirty, new, seconds and the re-scored user ids
+        """
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        user_ids = np.asarray(user_ids)
+        if user_ids.dtype.kind == "U":
+            user_ids = np.char.encode(user_ids)
+        if len(user_ids) and user_ids.dtype.itemsize > 24 and np.char.str_len(user_ids).max() > 24:
+            raise ValueError("user_ids must be at most 24 bytes long")
+        user_ids = user_ids.astype("S24")
+        usage = np.asarray(usage, dtype=np.float64).reshape(-1, len(FEATURES))
+        if len(np.unique(user_ids)) != len(user_ids):
+            raise ValueError("user_ids must be unique")
+
+        fingerprints = fingerprint_rows(usage, version_hash())
+        dirty = np.flatnonzero(self.dirty(user_ids, fingerprints))
+        _, found = self._lookup(user_ids[dirty])
+
+        updates = {name: np.zeros(len(dirty), dtype=dtype) for name, dtype in COLUMNS}
+        updates["user_id"] = user_ids[dirty]
+        updates["fingerprint"] = fingerprints[dirty]
+        updates["scored_at"][:] = now
+
+        for offset in range(0, len(dirty), batch_size):
+            chunk = slice(offset, offset + batch_size)
+            rows = usage[dirty[chunk]]
+            _, _, codes = validate_batch(rows)
+            results = recommend_batch(rows)
+            updates["issue"][chunk] = codes
+            for i, result in enumerate(results, start=offset):
+                if result["error"]:
+                    continue
+                updates["cluster"][i] = result["cluster"]
+                updates["prediction"][i] = result["addiction_status"] == "Addicted"
+                updates["probability"][i] = result["probability"]
+                updates["usage_score"][i] = result["usage_score"]
+
+        self._update(updates)
+        return {
+            "users": len(user_ids),
+            "dirty": len(dirty),
+            "new": int((~found).sum()),
+            "seconds": round(time.perf_counter() - start, 3),
+            "rescored": updates["user_id"],
+        }
+
+
+def latest_usage(store, start=None):
+    """
+    Each user's most recent usage vector from a history.HistoryStore.
+
+    Returns
+    -------
+    tuple: (user_ids sorted, usage array (n, 4))
+    """
+    parts = list(store.scan(start=start))
+    if not parts:
+        return np.empty(0, dtype="S24"), np.empty((0, len(FEATURES)))
+
+    user_ids = np.concatenate([p["user_id"] for p in parts])
+    timestamps = np.concatenate([p["timestamp"] for p in parts])
+    usage = np.concatenate([p["usage"] for p in parts])
+
+    order = np.lexsort((timestamps, user_ids))
+    user_ids = user_ids[order]
+    last = np.append(user_ids[1:] != user_ids[:-1], True)
+    return user_ids[last], usage[order][last].astype(np.float64)
+
+
+def rescore_history(store=None, path=STATE_DIR, full=False):
+    """
+    Nightly entry point: re-score users with changed history, model or rules and save the state.
+
+    Only analyses recorded since the previous run are scanned: a user
+    without new analyses has the same latest usage and, while the model and
+    rules are unchanged, the same result. The whole history is scanned on
+    the first run, when version_hash() changed, or with `full=True`.
+    """
+    if store is None:
+        from modules.history import get_store
+        store = get_store()
+    state = RescoringState.load(path)
+    since = state.meta.get("history_through")
+    if full or since is None or state.meta.get("version_hash") != int(version_hash()):
+        since = None
+
+    # Taken before the scan, so analyses appended during the run are picked up next time
+    scan_started = time.time()
+    user_ids, usage = latest_usage(store, start=since)
+    summary = state.run(user_ids, usage)
+    state.save(path, history_through=scan_started - WATERMARK_MARGIN)
+    summary["full"] = since is None
+    return summary
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n = 200_000
+    user_ids = np.array([f"{i:024x}" for i in range(n)], dtype="S24")
+    usage = np.column_stack([rng.integers(30, 600, n), rng.integers(5, 120, n),
+                             rng.integers(5, 80, n), rng.integers(0, 100, n)]).astype(float)
+
+    state = RescoringState()
+    print(f"first run:     {state.run(user_ids, usage)['seconds']}s, all {n} users scored")
+
+    summary = state.run(user_ids, usage)
+    print(f"no changes:    {summary['seconds']}s, {summary['dirty']} dirty")
+
+    changed = rng.choice(n, n // 100, replace=False)
+    usage[changed, 0] += 10
+    summary = state.run(user_ids, usage)
+    print(f"1% changed:    {summary['seconds']}s, {summary['dirty']} dirty")
+
+    prediction.MODEL_VERSION = "demo-v2"
+    summary = state.run(user_ids, usage)
+    print(f"model changed: {summary['seconds']}s, {summary['dirty']} dirty")
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the cache is then disabled
+    fcntl = None
+
+CACHE_NAME = os.environ.get("RESULT_CACHE_NAME", "detox_result_cache")
+CACHE_SETS = int(os.environ.get("RESULT_CACHE_SETS", 2048))
+WAYS = 8                 # slots per set; a key can only live in its set
+VALUE_BYTES = 1024       # serialized results larger than this are not cached
+LOCK_STRIPES = 64
+
+_MAGIC = 0x444554585243  # "DETXRC"
+
+SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"),            # seqlock counter: odd while a writer is updating the slot
+    ("key", "<f8", (4,)),
+    ("version", "<u8"),
+    ("used", "u1"),
+    ("ref", "u1"),             # CLOCK reference bit, set on every hit
+    ("length", "<u2"),
+    ("value", "u1", (VALUE_BYTES,)),
+])
+HEADER_DTYPE = np.dtype([("magic", "<u8"), ("sets", "<u8"), ("ways", "<u8"), ("value_bytes", "<u8")])
+
+
+def code_version(*modules):
+    """
+    Hash of the modules' source files. Entries outlive the workers that wrote
+    them, so callers add this to the version they cache under: a deploy that
+    changes how results are built then misses instead of serving old shapes.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _version_hash(model_version):
+    return int.from_bytes(hashlib.blake2b(str(model_version).encode(), digest_size=8).digest(), "little")
+
+
+class SharedResultCache:
+    """
+    Fixed-size result cache in named shared memory, shared by every worker
+    process on the host.
+
+    Keys are the validated usage vector plus model version; values are small
+    JSON documents. The table is set-associative: each key hashes to a set of
+    WAYS slots. Reads take no lock (a per-slot seqlock detects torn reads);
+    writers lock the set's stripe with fcntl byte-range locks, which work
+    across unrelated processes, and evict with CLOCK inside the set. fcntl
+    locks belong to the process, so threads of one worker also take the
+    stripe's threading.Lock first.
+    """
+
+    def __init__(self, name=CACHE_NAME, sets=CACHE_SETS):
+        self.name = name
+        self.sets = sets
+        size = HEADER_DTYPE.itemsize + sets * WAYS * SLOT_DTYPE.itemsize + sets
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # The segment outlives any single worker; don't let the tracker unlink it on exit
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        buf = self._shm.buf
+        self.header = np.ndarray(1, dtype=HEADER_DTYPE, buffer=buf)
+        if created:
+            self.header[0] = (_MAGIC, sets, WAYS, VALUE_BYTES)
+        else:
+            # The creating process may not have written the header yet
+            for _ in range(100):
+                if self.header[0]["magic"]:
+                    break
+                time.sleep(0.01)
+        if tuple(self.header[0]) != (_MAGIC, sets, WAYS, VALUE_BYTES):
+            raise ValueError(f"Shared memory {name!r} has an incompatible cache layout")
+
+        offset = HEADER_DTYPE.itemsize
+        self.slots = np.ndarray((sets, WAYS), dtype=SLOT_DTYPE, buffer=buf, offset=offset)
+        self.hands = np.ndarray(sets, dtype=np.uint8, buffer=buf, offset=offset + self.slots.nbytes)
+
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+b")
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @staticmethod
+    def _key(user_data):
+        # +0.0 folds -0.0 into 0.0 so equal keys hash equally
+        return np.asarray(user_data, dtype=np.float64).reshape(4) + 0.0
+
+    def _set_index(self, key, version):
+        digest = hashlib.blake2b(key.tobytes() + version.to_bytes(8, "little"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.sets
+
+    def get(self, user_data, model_version):
+        """Cached result dict, or None."""
+        key = self._key(user_data)
+        version = _version_hash(model_version)
+        ways = self.slots[self._set_index(key, version)]
+
+        candidates = np.flatnonzero((ways["used"] == 1) & (ways["version"] == version)
+                                    & (ways["key"] == key).all(axis=1))
+        for way in candidates:
+            slot = ways[way:way + 1]
+            seq = int(slot["seq"][0])
+            if seq % 2:
+                continue
+            length = int(slot["length"][0])
+            data = slot["value"][0, :length].tobytes()
+            matches = bool((slot["key"][0] == key).all()) and int(slot["version"][0]) == version
+            if matches and int(slot["seq"][0]) == seq:
+                slot["ref"] = 1
+                return json.loads(data)
+        return None
+
+    def put(self, user_data, model_version, result):
+        """Store a result; silently skipped if it does not fit in a slot."""
+        data = json.dumps(result, separators=(",", ":")).encode()
+        if len(data) > VALUE_BYTES:
+            return False
+
+        key = self._key(user_data)
+        version = _version_hash(model_version)
+        set_index = self._set_index(key, version)
+        ways = self.slots[set_index]
+        stripe = set_index % LOCK_STRIPES
+
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                self._write(ways, set_index, key, version, data)
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+        return True
+
+    def _write(self, ways, set_index, key, version, data):
+        """Fill a slot of the set; caller holds the set's stripe locks."""
+        existing = np.flatnonzero((ways["used"] == 1) & (ways["version"] == version)
+                                  & (ways["key"] == key).all(axis=1))
+        if len(existing):
+            way = int(existing[0])
+        else:
+            # CLOCK: skip (and clear) referenced slots until one can be evicted
+            way = int(self.hands[set_index])
+            for _ in range(2 * WAYS):
+                if not ways["used"][way] or not ways["ref"][way]:
+                    break
+                ways["ref"][way] = 0
+                way = (way + 1) % WAYS
+            self.hands[set_index] = (way + 1) % WAYS
+
+        slot = ways[way:way + 1]
+        slot["seq"] += 1
+        slot["key"] = key
+        slot["version"] = version
+        slot["length"] = len(data)
+        slot["value"][0, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+        slot["used"] = 1
+        slot["ref"] = 1
+        slot["seq"] += 1
+
+    def clear(self):
+        for lock in self._thread_locks:
+            lock.acquire()
+        fcntl.lockf(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self.slots["used"] = 0
+            self.slots["seq"] += 2
+        finally:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN)
+            for lock in self._thread_locks:
+                lock.release()
+
+    def unlink(self):
+        """Remove the shared segment (e.g. on deployment teardown)."""
+        # unlink() unregisters from the resource tracker, so register it back first
+        resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+
+
+class _NoCache:
+    def get(self, user_data, model_version):
+        return None
+
+    def put(self, user_data, model_version, result):
+        return False
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide handle on the shared cache; a no-op cache where unsupported."""
+    global _cache
+    if _cache is None:
+        if fcntl is None or os.environ.get("RESULT_CACHE_DISABLED"):
+            _cache = _NoCache()
+        else:
+            _cache = SharedResultCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    def worker(name, offset):
+        cache = SharedResultCache(name, sets=256)
+        hits = sum(cache.get([i, 10, 15, 5], "baseline") is not None for i in range(offset, offset + 500))
+        print(f"worker {offset}: {hits} hits out of 500 computed by the parent")
+
+    name = f"detox_cache_demo_{os.getpid()}"
+    cache = SharedResultCache(name, sets=256)
+    for i in range(1000):
+        cache.put([i, 10, 15, 5], "baseline", {"cluster": {"score": i}})
+
+    start = time.perf_counter()
+    for i in range(1000):
+        cache.get([i, 10, 15, 5], "baseline")
+    print(f"get: {(time.perf_counter() - start) / 1000 * 1e6:.1f} us")
+
+    procs = [multiprocessing.Process(target=worker, args=(name, offset)) for offset in (0, 500)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    cache.unlink()
@@ -0,0 +1,164 @@
+import math
+import numbers
+
+import numpy as np
+
+FEATURES = ["daily_screen_time", "session_duration", "app_switches", "night_activity"]
+
+# Issue flags; a row can have several
+ZERO_USAGE = 1
+NEGATIVE_VALUES = 2
+UNREALISTIC_SCREEN_TIME = 4
+INVALID_NIGHT_ACTIVITY = 8
+NOT_FINITE = 16
+LOW_USAGE = 32          # informational: under 30 min/day, predicted healthy without the model
+
+MAX_SCREEN_TIME = 1440  # minutes in a day
+LOW_USAGE_MINUTES = 30
+
+# Issues that make a row unusable, in the order they are reported.
+# Names match what recommendation.is_valid_user_data has always returned.
+ISSUES = [
+    (NOT_FINITE, "not_finite"),
+    (ZERO_USAGE, "zero_usage"),
+    (NEGATIVE_VALUES, "negative_values"),
+    (UNREALISTIC_SCREEN_TIME, "unrealistic_screen_time"),
+    (INVALID_NIGHT_ACTIVITY, "invalid_night_activity"),
+]
+ISSUE_NAMES = [None] + [name for _, name in ISSUES]   # index = status code
+BLOCKING = NOT_FINITE | ZERO_USAGE | NEGATIVE_VALUES | UNREALISTIC_SCREEN_TIME | INVALID_NIGHT_ACTIVITY
+
+
+def check_rows(rows):
+    """
+    Issue flags for an (n, 4) float array, computed column-wise for all rows.
+
+    Returns
+    -------
+    numpy uint8 array of shape (n,) with OR-ed issue flags
+    """
+    screen, night = rows[:, 0], rows[:, 3]
+    with np.errstate(invalid="ignore"):
+        flags = np.where(~np.isfinite(rows).all(axis=1), NOT_FINITE, 0)
+        flags |= np.where((rows == 0).all(axis=1), ZERO_USAGE, 0)
+        flags |= np.where((rows < 0).any(axis=1), NEGATIVE_VALUES, 0)
+        flags |= np.where(screen > MAX_SCREEN_TIME, UNREALISTIC_SCREEN_TIME, 0)
+        flags |= np.where(night > screen, INVALID_NIGHT_ACTIVITY, 0)
+        flags |= np.where(screen < LOW_USAGE_MINUTES, LOW_USAGE, 0)
+    return flags.astype(np.uint8)
+
+
+def check_values(values):
+    """
+    Issue flags for one usage vector, with the same rules as check_rows.
+
+    Plain scalar comparisons: for a single vector this is an order of
+    magnitude cheaper than building an array for check_rows.
+    """
+    screen, session, switches, night = values
+    flags = 0
+    if not (math.isfinite(screen) and math.isfinite(session) and math.isfinite(switches)
+            and math.isfinite(night)):
+        flags |= NOT_FINITE
+    if screen == 0 and session == 0 and switches == 0 and night == 0:
+        flags |= ZERO_USAGE
+    if screen < 0 or session < 0 or switches < 0 or night < 0:
+        flags |= NEGATIVE_VALUES
+    if screen > MAX_SCREEN_TIME:
+        flags |= UNREALISTIC_SCREEN_TIME
+    if night > screen:
+        flags |= INVALID_NIGHT_ACTIVITY
+    if screen < LOW_USAGE_MINUTES:
+        flags |= LOW_USAGE
+    return flags
+
+
+def status_codes(flags):
+    """
+    Highest-priority blocking issue per row as an index into ISSUE_NAMES
+    (0 = valid), without a Python loop over rows.
+    """
+    flags = np.asarray(flags)
+    return np.select([flags & flag != 0 for flag, _ in ISSUES],
+                     np.arange(1, len(ISSUES) + 1), default=0).astype(np.uint8)
+
+
+class ValidatedUsage(tuple):
+    """
+    Usage vector that has already been through validate().
+
+    Behaves like the original list (indexing, len, iteration keep the caller's
+    values) and carries the issue flags, so downstream functions can skip
+    re-checking it.
+    """
+
+    def __new__(cls, values, flags):
+        usage = super().__new__(cls, values)
+        usage.flags = int(flags)
+        return usage
+
+    @property
+    def issue(self):
+        """Name of the highest-priority blocking issue, or None if valid."""
+        for flag, name in ISSUES:
+            if self.flags & flag:
+                return name
+        return None
+
+    def has(self, flag):
+        return bool(self.flags & flag)
+
+
+def validate(user_data):
+    """
+    Validate a single usage vector once and mark it as trusted.
+
+    Raises
+    ------
+    ValueError : if the input does not have 4 numeric values
+
+    Returns
+    -------
+    ValidatedUsage (returned unchanged if already validated)
+    """
+    if isinstance(user_data, ValidatedUsage):
+        return user_data
+    if len(user_data) != len(FEATURES):
+        raise ValueError(f"Expected {len(FEATURES)} features: {FEATURES}, got {len(user_data)}")
+    # The caller's values are kept as-is, so they must already be numbers ("100" would
+    # convert here but fail later in np.dot)
+    # int/float are checked by type first; the numbers.Real ABC check is slower
+    if not all(type(v) in (int, float) or (isinstance(v, numbers.Real) and not isinstance(v, bool))
+               for v in user_data):
+        raise ValueError(f"Usage values must be numbers: {FEATURES}")
+    return ValidatedUsage(user_data, check_values(user_data))
+
+
+def validate_batch(rows):
+    """
+    Validate an (n, 4) batch in one vectorized pass.
+
+    Returns
+    -------
+    tuple: (rows, flags, codes) - rows as a float array, per-row issue flags,
+    and per-row status codes indexing ISSUE_NAMES (0 = valid)
+    """
+    rows = np.asarray(rows, dtype=float)
+    if rows.ndim != 2 or rows.shape[1] != len(FEATURES):
+        raise ValueError(f"Expected rows of {len(FEATURES)} features: {FEATURES}")
+    flags = check_rows(rows)
+    return rows, flags, status_codes(flags)
+
+
+if __name__ == "__main__":
+    rows = [
+        [120, 10, 15, 5],
+        [0, 0, 0, 0],
+        [20, -5, 1, 1],
+        [1500, 30, 40, 50],
+        [100, 10, 10, 200],
+        [15, 5, 3, 2],
+    ]
+    _, flags, codes = validate_batch(rows)
+    for row, flag, code in zip(rows, flags, codes):
+        print(f"{row}: flags={flag:06b} issue={ISSUE_NAMES[code]}")
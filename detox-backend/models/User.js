@@ -6,6 +6,7 @@ const userSchema = new mongoose.Schema({
   email: { type: String, required: true, unique: true },
   password: { type: String, required: true },
   createdAt: { type: Date, default: Date.now },
+  // Legacy: analyses are now kept in the AI service's history store (GET /api/analyze/history)
   usageHistory: [
     {
       date: { type: Date, default: Date.now },
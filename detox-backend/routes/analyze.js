@@ -1,10 +1,76 @@
 import express from "express";
 import axios from "axios";
+import http from "http";
+import https from "https";
+import { encode, decode } from "@msgpack/msgpack";
 import auth from "../middleware/auth.js";
-import User from "../models/User.js";
 
 const router = express.Router();
 const FLASK_URL = process.env.FLASK_URL || "http://127.0.0.1:5000";
+const MAX_CATALOGS = 16;
+
+// One client with keep-alive agents, so requests reuse connections to the AI service
+const flask = axios.create({
+  baseURL: FLASK_URL,
+  httpAgent: new http.Agent({ keepAlive: true }),
+  httpsAgent: new https.Agent({ keepAlive: true }),
+  headers: { "Content-Type": "application/msgpack", Accept: "application/msgpack" },
+  responseType: "arraybuffer",
+  transformRequest: [(data) => encode(data)],
+  transformResponse: [(data) => (data && data.byteLength ? decode(new Uint8Array(data)) : null)]
+});
+
+// Message catalogs by version (the /messages ETag). /analyze answers with
+// message ids plus the version of the catalog they refer to, so the catalog
+// is fetched once per locale and AI service deployment.
+const catalogs = new Map();
+
+function getCatalog(version, language) {
+  if (!catalogs.has(version)) {
+    const request = flask
+      .get("/messages", { headers: { "Accept-Language": language } })
+      .then((res) => {
+        if (res.data.version !== version) catalogs.delete(version);
+        return res.data;
+      })
+      .catch((err) => {
+        catalogs.delete(version);
+        throw err;
+      });
+    catalogs.set(version, request);
+    if (catalogs.size > MAX_CATALOGS) catalogs.delete(catalogs.keys().next().value);
+  }
+  return catalogs.get(version);
+}
+
+// Same rules as messages.from_message_ids in the AI service; templates use positional {0}, {1}
+function expandIds(value, messages) {
+  if (Array.isArray(value)) return value.map((item) => expandIds(item, messages));
+  if (value && typeof value === "object") {
+    const keys = Object.keys(value);
+    if (keys.length === 1 && keys[0] === "id") return messages[value.id];
+    if (keys.length === 2 && "id" in value && "params" in value)
+      return messages[value.id].replace(/\{(\d+)\}/g, (_, i) => String(value.params[i]));
+    return Object.fromEntries(keys.map((key) => [key, expandIds(value[key], messages)]));
+  }
+  return value;
+}
+
+async function analyze(usage, userId, language) {
+  const headers = { "Accept-Language": language };
+  const { data } = await flask.post("/analyze", { usage, user_id: userId, message_ids: true }, { headers });
+  if (data.error) return data;
+
+  const { catalog_version: version, ...result } = data;
+  const catalog = await getCatalog(version, language);
+  if (catalog.version !== version) {
+    // The AI service was redeployed between the two calls; ask for rendered text
+    // instead (without user_id: the first call already recorded the analysis)
+    return (await flask.post("/analyze", { usage }, { headers })).data;
+  }
+  result.recommendations = expandIds(result.recommendations, catalog.messages);
+  return result;
+}
 
 router.post("/", auth, async (req, res) => {
   try {
@@ -12,24 +78,30 @@ router.post("/", auth, async (req, res) => {
     if (!usage || usage.length !== 4)
       return res.status(400).json({ error: true, message: "Usage must have 4 numbers" });
 
-    const flaskRes = await axios.post(`${FLASK_URL}/analyze`, { usage });
-
-    await User.findByIdAndUpdate(req.user.id, {
-      $push: {
-        usageHistory: {
-          usage,
-          cluster: flaskRes.data.cluster,
-          prediction: flaskRes.data.prediction,
-          recommendations: flaskRes.data.recommendations
-        }
-      }
-    });
-
-    res.json(flaskRes.data);
+    // Texts are expanded in the client's language from the cached catalog. The AI
+    // service records the analysis in its history store under user_id, so nothing
+    // is added to the user document.
+    const result = await analyze(usage, req.user.id, req.get("Accept-Language") || "en");
+    res.json(result);
   } catch (err) {
     console.error("Analyze error:", err.message);
     res.status(500).json({ error: true, message: "Internal server error" });
   }
 });
 
+// The user's past analyses from the AI service's history store (?n=10 or ?start=&end=, epoch seconds)
+router.get("/history", auth, async (req, res) => {
+  try {
+    const { n, start, end } = req.query;
+    const { status, data } = await flask.get(`/history/${encodeURIComponent(req.user.id)}`, {
+      params: { n, start, end },
+      validateStatus: (code) => code < 500
+    });
+    res.status(status).json(data);
+  } catch (err) {
+    console.error("History error:", err.message);
+    res.status(500).json({ error: true, message: "Internal server error" });
+  }
+});
+
 export default router;